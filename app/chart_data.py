@@ -0,0 +1,72 @@
+# app/chart_data.py
+# Chart-ready time series for the dashboard. A panel query returns per-day totals once; pre_bin() rolls them up to
+# day, week and month in the panel worker (so the binned series are what the result cache keeps), and the render
+# step only picks one. pick_resolution() chooses the finest resolution that keeps a date span readable, and
+# line_figure() sends the points as typed numeric arrays (epoch ms on a date axis) to a WebGL Scattergl trace,
+# downsampled with Largest-Triangle-Three-Buckets when a series is still longer than the chart can show.
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Resolution -> resample rule; weeks end on Monday as in the SQL/rollup weekly panels
+RESOLUTIONS = {"day": "D", "week": "W-MON", "month": "MS"}
+_DAYS_PER = {"day": 1, "week": 7, "month": 30.44}
+
+# Buckets a span may have before pick_resolution() moves to a coarser resolution
+TARGET_POINTS = 400
+# Points sent to the browser per series; longer series are downsampled (LTTB)
+MAX_POINTS = 1500
+
+
+def pre_bin(daily, day_col="day", value_col="n"):
+    """{resolution: Series of totals indexed by bin start (weeks: end)} from per-day totals; missing days are 0."""
+    if daily.empty:
+        return {r: pd.Series(dtype="int64", index=pd.DatetimeIndex([])) for r in RESOLUTIONS}
+    s = pd.Series(daily[value_col].to_numpy(), index=pd.to_datetime(daily[day_col])).sort_index()
+    return {r: s.resample(rule).sum() for r, rule in RESOLUTIONS.items()}
+
+
+def pick_resolution(start, end, target_points=TARGET_POINTS):
+    """The finest of day / week / month with at most `target_points` buckets between start and end."""
+    days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+    for resolution, per in _DAYS_PER.items():
+        if days / per <= target_points:
+            return resolution
+    return "month"
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: `n_out` of the points (x ascending) that keep the series' visual shape.
+
+    The first and last points are kept; each bucket in between keeps the point forming the largest triangle with
+    the previously kept point and the average of the next bucket.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+    xf, yf = x.astype(np.float64), y.astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # n_out - 2 buckets over the interior points
+    # Bucket means from cumulative sums; the bucket after the last one is the final point
+    cx, cy = np.concatenate(([0.0], np.cumsum(xf))), np.concatenate(([0.0], np.cumsum(yf)))
+    width = np.diff(edges)
+    mean_x = np.append((cx[edges[1:]] - cx[edges[:-1]]) / width, xf[-1])
+    mean_y = np.append((cy[edges[1:]] - cy[edges[:-1]]) / width, yf[-1])
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((xf[a] - mean_x[i + 1]) * (yf[lo:hi] - yf[a]) - (xf[a] - xf[lo:hi]) * (mean_y[i + 1] - yf[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+
+def line_figure(series, title, y_title=None, max_points=MAX_POINTS):
+    """A WebGL line chart of a datetime-indexed series, at most `max_points` points."""
+    x = series.index.values.astype("datetime64[ms]").astype(np.int64)
+    y = series.to_numpy(dtype=np.float64)
+    x, y = lttb(x, y, max_points)
+    fig = go.Figure(go.Scattergl(x=x, y=y, mode="lines", hovertemplate="%{x|%Y-%m-%d}: %{y:,}<extra></extra>"))
+    fig.update_layout(title=title, xaxis={"type": "date"}, yaxis={"title": y_title}, showlegend=False)
+    return fig
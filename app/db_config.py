@@ -0,0 +1,55 @@
+# app/db_config.py
+# Shared .env / DATABASE_URL handling for the dashboard and the command-line jobs.
+import os
+import urllib.parse
+
+from dotenv import load_dotenv
+from sqlalchemy.engine import make_url
+
+
+def load_env():
+    # Load .env (try parent folder first, then current)
+    if os.path.exists('../.env'):
+        load_dotenv('../.env')
+    else:
+        load_dotenv()
+
+
+def database_url():
+    # Build DB connection safely (handles special characters in password)
+    user = os.getenv("MYSQL_USER")
+    password = urllib.parse.quote_plus(os.getenv("MYSQL_PASSWORD") or "")
+    host = os.getenv("MYSQL_HOST", "127.0.0.1")
+    port = os.getenv("MYSQL_PORT", "3306")
+    db = os.getenv("MYSQL_DB", "crm_db")
+
+    # If user provided a full DATABASE_URL in .env, prefer it; otherwise build one
+    return os.getenv("DATABASE_URL") or f"mysql+pymysql://{user}:{password}@{host}:{port}/{db}"
+
+
+def replica_urls():
+    # Optional read replicas: a comma-separated list of SQLAlchemy URLs (see db_router.py)
+    return [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+
+
+def replica_connect_args(url):
+    # Bound how long connecting to a replica may take (CRM_REPLICA_CONNECT_TIMEOUT s), so a replica that stops
+    # answering fails its health check and is skipped instead of holding a request thread
+    timeout = float(os.getenv("CRM_REPLICA_CONNECT_TIMEOUT", "3"))
+    backend = make_url(url).get_backend_name()
+    if backend == "mysql":
+        return {"connect_timeout": timeout}
+    if backend == "sqlite":
+        return {"timeout": timeout}  # how long a locked stand-in file (mid copy-sqlite) is waited for
+    return {}
+
+
+def pool_options():
+    # Explicit pool sizing for the one engine the process shares: the panel loader runs queries on several
+    # threads at once, so the pool must hold at least its worker count (see panel_loader.py)
+    return {
+        "pool_size": int(os.getenv("CRM_DB_POOL_SIZE", "8")),
+        "max_overflow": int(os.getenv("CRM_DB_MAX_OVERFLOW", "4")),
+        "pool_timeout": float(os.getenv("CRM_DB_POOL_TIMEOUT", "10")),
+        "pool_recycle": int(os.getenv("CRM_DB_POOL_RECYCLE", "1800")),
+    }
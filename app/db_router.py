@@ -0,0 +1,226 @@
+# app/db_router.py
+# Primary / read-replica routing for the dashboard. Writes (the forms, write_service) always use the primary
+# engine; analytics reads (table cache refreshes, panel queries, the activity feed, exports) go through the
+# router, whose connect() hands out connections round-robin over the healthy replicas and falls back to the
+# primary when none is usable. A replica is skipped after a failed connect or health check until it passes
+# the next check (every check_interval s); on MySQL the check also reads the replication delay and skips
+# replicas more than max_lag s behind. A due check runs on the one request thread that claims it; others
+# meanwhile go by the replica's last result, so a hung replica holds up at most that thread, and only for the
+# replica engine's connect timeout (db_config.replica_connect_args). A session that has just written is pinned
+# to the primary for `sticky` seconds (read-your-writes), which covers the delay the health check allows.
+#
+# Locally, SQLite files can stand in for the replicas; copy the primary onto them now and then:
+#
+#   DATABASE_URL=sqlite:///crm.db DATABASE_REPLICA_URLS=sqlite:///r1.db,sqlite:///r2.db \
+#       streamlit run app/streamlit_app.py
+#   python app/db_router.py copy-sqlite crm.db r1.db r2.db --every 30    # "replication" with a 30 s lag
+#   python app/db_router.py status                                      # health and lag of each server
+import argparse
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError
+
+log = logging.getLogger(__name__)
+
+_LAG_COLUMNS = ("Seconds_Behind_Source", "Seconds_Behind_Master")
+
+
+class _Server:
+    def __init__(self, engine):
+        self.engine = engine
+        self.healthy = True
+        self.lag = None
+        self.checked_at = 0.0
+        self.error = None
+        self.reads = 0
+        self.checking = False
+
+
+def replication_lag(conn):
+    """Seconds the MySQL replica behind `conn` trails its source; None if it is not a replica (or not MySQL).
+
+    Raises LookupError when replication is configured but not running.
+    """
+    if conn.dialect.name != "mysql":
+        return None
+    for statement in ("SHOW REPLICA STATUS", "SHOW SLAVE STATUS"):
+        try:
+            row = conn.exec_driver_sql(statement).mappings().first()
+        except DBAPIError:
+            continue  # older server (no SHOW REPLICA STATUS) or no REPLICATION CLIENT privilege
+        if row is None:
+            return None
+        for column in _LAG_COLUMNS:
+            if column in row:
+                if row[column] is None:
+                    raise LookupError("replication is not running")
+                return float(row[column])
+    return None
+
+
+class DbRouter:
+    """The primary engine plus health-checked, load-balanced read replicas.
+
+    Pass the router wherever an engine is only used for reads (anything calling connect()); use `primary` for
+    writes, and reader(state) for a session's reads so it sees its own writes.
+    """
+
+    def __init__(self, primary, replicas=(), check_interval=10.0, max_lag=30.0, sticky=None):
+        self.primary = primary
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self.sticky = max_lag if sticky is None else sticky
+        self._servers = [_Server(engine) for engine in replicas]
+        self._next = itertools.cycle(range(len(self._servers))) if self._servers else None
+        self._lock = threading.Lock()
+
+    @property
+    def replicas(self):
+        return [server.engine for server in self._servers]
+
+    @property
+    def dialect(self):
+        return self.primary.dialect
+
+    def _claim(self, server, force=False):
+        # True if the caller should check `server` now: a check is due (or forced) and no other thread runs one
+        with self._lock:
+            if server.checking or not (force or time.monotonic() - server.checked_at >= self.check_interval):
+                return False
+            server.checking = True
+            return True
+
+    def _mark_down(self, server, exc):
+        with self._lock:
+            server.healthy, server.error = False, str(exc).splitlines()[0]
+            server.checked_at = time.monotonic()
+
+    def _check(self, server):
+        # Callers have claimed the server
+        try:
+            with server.engine.connect() as conn:
+                conn.exec_driver_sql("SELECT 1")
+                lag = replication_lag(conn)
+            with self._lock:
+                server.lag = lag
+                server.healthy = lag is None or lag <= self.max_lag
+                server.error = None if server.healthy else f"{lag:g}s behind"
+                server.checked_at = time.monotonic()
+        except (SQLAlchemyError, LookupError) as exc:
+            self._mark_down(server, exc)
+        finally:
+            with self._lock:
+                server.checking = False
+        if not server.healthy:
+            log.warning("replica %s skipped: %s", server.engine.url.render_as_string(), server.error)
+
+    def _candidates(self):
+        # Healthy replicas in round-robin order, re-checking any whose last check is older than check_interval
+        with self._lock:
+            start = next(self._next)
+        order = self._servers[start:] + self._servers[:start]
+        for server in order:
+            if self._claim(server):
+                self._check(server)
+            if server.healthy:
+                yield server
+
+    def connect(self):
+        """A read connection: from the next healthy replica, or the primary if no replica can be reached."""
+        for server in self._candidates() if self._servers else ():
+            try:
+                conn = server.engine.connect()
+            except SQLAlchemyError as exc:  # driver errors, and a pool TimeoutError when the replica is saturated
+                self._mark_down(server, exc)
+                log.warning("replica %s unreachable, trying the next", server.engine.url.render_as_string())
+                continue
+            with self._lock:
+                server.reads += 1
+            return conn
+        return self.primary.connect()
+
+    def reader(self, state=None):
+        """What a session should read from: the primary while it is pinned by wrote(state), otherwise the router."""
+        if not self._servers or (state is not None and state.get("db_primary_until", 0.0) > time.time()):
+            return self.primary
+        return self
+
+    def wrote(self, state):
+        """Pin the session owning `state` (a dict such as st.session_state) to the primary for `sticky` seconds."""
+        if self._servers:
+            state["db_primary_until"] = time.time() + self.sticky
+
+    def status(self, check=False):
+        """One row per server: role, health, replication lag, last error and reads served."""
+        primary = {"server": self.primary.url.render_as_string(), "role": "primary", "healthy": True, "lag_s": None,
+                   "error": None, "reads": None}
+        if check:
+            try:
+                with self.primary.connect() as conn:
+                    conn.exec_driver_sql("SELECT 1")
+            except SQLAlchemyError as exc:
+                primary["healthy"], primary["error"] = False, str(exc).splitlines()[0]
+        rows = [primary]
+        for server in self._servers:
+            if check and self._claim(server, force=True):
+                self._check(server)
+            rows.append({"server": server.engine.url.render_as_string(), "role": "replica",
+                         "healthy": server.healthy, "lag_s": server.lag, "error": server.error, "reads": server.reads})
+        return rows
+
+
+def copy_sqlite(source, targets):
+    """Copy a SQLite database onto each target file with the online backup API (a consistent snapshot)."""
+    src = sqlite3.connect(source)
+    try:
+        for target in targets:
+            dst = sqlite3.connect(target)
+            try:
+                src.backup(dst)
+            finally:
+                dst.close()
+    finally:
+        src.close()
+
+
+def main():
+    from sqlalchemy import create_engine
+
+    from db_config import database_url, load_env, replica_connect_args, replica_urls
+
+    parser = argparse.ArgumentParser(description="Read-replica status, and SQLite stand-in replication")
+    sub = parser.add_subparsers(dest="command", required=True)
+    status = sub.add_parser("status", help="check the primary and every replica")
+    status.add_argument("--database-url", help="primary (defaults to .env / DATABASE_URL)")
+    status.add_argument("--replica-url", action="append", help="replica (defaults to DATABASE_REPLICA_URLS)")
+    copy = sub.add_parser("copy-sqlite", help="copy a SQLite primary onto SQLite replica files")
+    copy.add_argument("source")
+    copy.add_argument("targets", nargs="+")
+    copy.add_argument("--every", type=float, help="keep copying every N seconds (simulated replication lag)")
+    args = parser.parse_args()
+
+    if args.command == "copy-sqlite":
+        while True:
+            started = time.perf_counter()
+            copy_sqlite(args.source, args.targets)
+            print(f"copied {args.source} -> {', '.join(args.targets)} in {time.perf_counter() - started:.2f}s")
+            if not args.every:
+                return
+            time.sleep(args.every)
+
+    load_env()
+    primary = create_engine(args.database_url or database_url(), pool_pre_ping=True)
+    replicas = [create_engine(url, pool_pre_ping=True, connect_args=replica_connect_args(url))
+                for url in args.replica_url or replica_urls()]
+    for row in DbRouter(primary, replicas).status(check=True):
+        lag = "" if row["lag_s"] is None else f" lag {row['lag_s']:g}s"
+        state = "ok" if row["healthy"] else f"DOWN ({row['error']})"
+        print(f"{row['role']:8} {state}{lag}  {row['server']}")
+
+
+if __name__ == "__main__":
+    main()
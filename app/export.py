@@ -0,0 +1,156 @@
+# app/export.py
+# Streaming export of filtered leads/opportunities.
+# Rows are read from the database in chunks through a server-side cursor (stream_results) and written
+# chunk by chunk as CSV, gzip-CSV or Parquet, so memory stays bounded by the chunk size rather than the
+# export size. The dashboard spools into a SpooledTemporaryFile (spills to disk past `spool_mb`) with a row limit,
+# since its download button holds the whole file in memory; the CLI writes straight to a file and has no size
+# limit at all:
+#
+#   python app/export.py --kind opps --format parquet --from 2024-01-01 --to 2024-12-31 --out opps_2024.parquet
+import argparse
+import gzip
+import io
+import os
+import shlex
+import tempfile
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import create_engine, text
+
+from frame_dtypes import DATETIME_COLS, FLOAT_COLS, INT_COLS
+from query_layer import Filters, leads_where, opps_where
+
+EXPORTS = {
+    "leads": (
+        "SELECT l.*, s.name AS source_name, u.name AS owner_name FROM leads l "
+        "LEFT JOIN sources s ON l.source_id = s.id "
+        "LEFT JOIN users u ON l.owner_id = u.id "
+        "WHERE {where} ORDER BY l.id",
+        leads_where,
+    ),
+    "opps": (
+        "SELECT o.*, s.name AS stage_name, u.name AS owner_name FROM opportunities o "
+        "LEFT JOIN stages s ON o.stage_id = s.id "
+        "LEFT JOIN users u ON o.owner_id = u.id "
+        "WHERE {where} ORDER BY o.id",
+        opps_where,
+    ),
+}
+
+# format -> (file extension, mime type)
+FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+
+def _stable_types(df):
+    # Per-chunk dtype inference differs between chunks (an all-NULL chunk, small ids, ...);
+    # pin every column to one type so Parquet row groups share a schema
+    out = {}
+    for col in df.columns:
+        if col in DATETIME_COLS:
+            out[col] = pd.to_datetime(df[col])
+        elif col in INT_COLS:
+            out[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
+        elif col in FLOAT_COLS:
+            out[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+        else:
+            out[col] = df[col].astype("string")
+    return pd.DataFrame(out)
+
+
+def iter_chunks(engine, kind, f, chunksize=50_000, limit=None):
+    query, where = EXPORTS[kind]
+    sql, params = query.format(where=where(f)), f.params()
+    if limit is not None:
+        sql, params = sql + " LIMIT :limit", {**params, "limit": int(limit)}
+    with engine.connect() as conn:
+        conn = conn.execution_options(stream_results=True, max_row_buffer=chunksize)
+        yield from pd.read_sql(text(sql), conn, params=params, chunksize=chunksize)
+
+
+def write_export(engine, kind, f, fmt, fileobj, chunksize=50_000, limit=None):
+    """Write the export for `kind` under filters `f` (at most `limit` rows) to binary `fileobj`; returns the rows."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}")
+    rows = 0
+    if fmt == "parquet":
+        writer = None
+        try:
+            for chunk in iter_chunks(engine, kind, f, chunksize, limit):
+                table = pa.Table.from_pandas(_stable_types(chunk), preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(fileobj, table.schema, compression="snappy")
+                writer.write_table(table.cast(writer.schema))
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+
+    gz = gzip.GzipFile(fileobj=fileobj, mode="wb") if fmt == "csv.gz" else None
+    out = io.TextIOWrapper(gz or fileobj, encoding="utf-8", newline="")
+    try:
+        for chunk in iter_chunks(engine, kind, f, chunksize, limit):
+            chunk.to_csv(out, header=(rows == 0), index=False)
+            rows += len(chunk)
+        out.flush()
+    finally:
+        # Detach so closing the wrapper/gzip stream leaves the caller's file open
+        out.detach()
+        if gz is not None:
+            gz.close()
+    return rows
+
+
+def spooled_export(engine, kind, f, fmt, chunksize=50_000, spool_mb=32, limit=None):
+    """Export into a SpooledTemporaryFile rewound to the start; returns (file, rows, file name, mime type)."""
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_mb * 2**20)
+    rows = write_export(engine, kind, f, fmt, spool, chunksize, limit)
+    spool.seek(0)
+    ext, mime = FORMATS[fmt]
+    return spool, rows, f"{kind}_filtered{ext}", mime
+
+
+def cli_command(kind, f, fmt):
+    """The `python app/export.py ...` line that writes the same export as the dashboard would."""
+    args = ["python", "app/export.py", "--kind", kind, "--format", fmt]
+    for flag, value in (("--owner", f.owner), ("--source", f.source)):
+        if value != "All":
+            args += [flag, shlex.quote(value)]
+    for flag, value in (("--from", f.date_min), ("--to", f.date_max)):
+        if value is not None:
+            args += [flag, value.isoformat()]
+    return " ".join(args + ["--out", f"{kind}_filtered{FORMATS[fmt][0]}"])
+
+
+def main():
+    from db_config import database_url, load_env
+
+    parser = argparse.ArgumentParser(description="Export filtered leads or opportunities")
+    parser.add_argument("--kind", choices=sorted(EXPORTS), required=True)
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv.gz")
+    parser.add_argument("--owner", default="All")
+    parser.add_argument("--source", default="All")
+    parser.add_argument("--from", dest="date_min", type=date.fromisoformat)
+    parser.add_argument("--to", dest="date_max", type=date.fromisoformat)
+    parser.add_argument("--chunksize", type=int, default=50_000)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL / MYSQL_* from .env")
+    args = parser.parse_args()
+
+    load_env()
+    engine = create_engine(args.database_url or database_url(), pool_pre_ping=True)
+    f = Filters(owner=args.owner, source=args.source, date_min=args.date_min, date_max=args.date_max)
+    with open(args.out, "wb") as fh:
+        rows = write_export(engine, args.kind, f, args.format, fh, args.chunksize)
+    print(f"wrote {rows:,} rows to {args.out} ({os.path.getsize(args.out) / 2**20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# app/frame_dtypes.py
+# Memory-compact dtypes for the cached CRM frames.
+# Dtypes are chosen by column name, since the same columns (owner_name, status, *_id, ...) mean the same thing
+# in every table: low-cardinality labels become categoricals, ids and scores the smallest integer type that
+# fits (nullable when the column has NULLs), DATETIME columns datetime64 and free text Arrow-backed strings.
+import numpy as np
+import pandas as pd
+
+CATEGORY_COLS = (
+    "owner_name", "source_name", "stage_name", "user_name", "status", "activity_type", "role", "subject",
+)
+INT_COLS = (
+    "id", "owner_id", "source_id", "lead_id", "customer_id", "stage_id", "opportunity_id", "user_id",
+    "lead_score", "stage_order",
+)
+DATETIME_COLS = (
+    "created_at", "updated_at", "converted_at", "stage_entered_at", "closed_at", "due_date", "entered_at", "left_at",
+)
+# DECIMAL(12,2) money: float64 holds every value of that type to the cent (float32 would not), and replaces
+# the per-row Decimal objects the MySQL driver returns
+FLOAT_COLS = ("value",)
+TEXT_COLS = ("name", "email", "phone", "company", "notes")
+
+_INT_TYPES = [np.int8, np.int16, np.int32, np.int64]
+_UINT_TYPES = [np.uint8, np.uint16, np.uint32, np.uint64]
+
+
+def smallest_int_dtype(series):
+    """Smallest numpy (or pandas nullable, if there are NULLs) integer dtype that holds `series`."""
+    values = pd.to_numeric(series, errors="coerce")
+    nullable = values.isna().any()
+    if values.isna().all():
+        return "Int8"
+    lo, hi = values.min(), values.max()
+    for t in (_UINT_TYPES if lo >= 0 else _INT_TYPES):
+        info = np.iinfo(t)
+        if info.min <= lo and hi <= info.max:
+            name = np.dtype(t).name
+            return name.capitalize().replace("Uint", "UInt") if nullable else name
+    return "Int64" if nullable else "int64"
+
+
+def compact_frame(df):
+    """Return a copy of `df` with compact dtypes applied to the columns this module knows about."""
+    out = df.copy()
+    if out.empty:
+        return out
+    for col in out.columns:
+        if col in DATETIME_COLS:
+            out[col] = pd.to_datetime(out[col])
+        elif col in INT_COLS:
+            out[col] = pd.to_numeric(out[col], errors="coerce").astype(smallest_int_dtype(out[col]))
+        elif col in FLOAT_COLS:
+            out[col] = pd.to_numeric(out[col], errors="coerce").astype("float64")
+        elif col in CATEGORY_COLS:
+            out[col] = out[col].astype("category")
+        elif col in TEXT_COLS:
+            out[col] = out[col].astype("string[pyarrow]")
+    return out
+
+
+def align_categories(left, right):
+    """Give shared categorical columns identical categories so pd.concat keeps them categorical.
+
+    Only `right` (the small delta) is recoded in the common case; `left` is copied only when the
+    delta brings a label it has not seen before.
+    """
+    copied = False
+    for col in left.columns.intersection(right.columns):
+        if not isinstance(left[col].dtype, pd.CategoricalDtype):
+            continue
+        new = pd.Index(right[col].dropna().astype(object).unique()).difference(left[col].cat.categories)
+        if len(new):
+            if not copied:
+                left, copied = left.copy(), True
+            left[col] = left[col].cat.add_categories(new)
+        right[col] = pd.Categorical(right[col], categories=left[col].cat.categories)
+    return left, right
+
+
+def concat_compact(frames):
+    """Concatenate separately compacted frames (chunks of one query) into one compact frame.
+
+    Categoricals get the union of the chunks' categories so they stay categorical, and integer columns are
+    narrowed again afterwards, since chunks may have picked different widths.
+    """
+    frames = [f for f in frames if len(f)] or frames[:1]
+    if len(frames) == 1:
+        return frames[0]
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            # Chunks where the column is all NULL have no categories (of whatever dtype); leave them out
+            labelled = [f[col] for f in frames if len(f[col].cat.categories)]
+            if not labelled:
+                continue
+            categories = pd.api.types.union_categoricals(labelled, ignore_order=True).categories
+            for f in frames:
+                f[col] = f[col].cat.set_categories(categories)
+    out = pd.concat(frames, ignore_index=True)
+    for col in out.columns.intersection(INT_COLS):
+        dtype = smallest_int_dtype(out[col])
+        if out[col].dtype != dtype:
+            out[col] = out[col].astype(dtype)
+    return out
+
+
+def frame_memory(df):
+    return int(df.memory_usage(deep=True).sum()) if df is not None else 0
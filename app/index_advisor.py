@@ -0,0 +1,332 @@
+# app/index_advisor.py
+# Index migration matched to the queries the dashboard, the jobs and db/queries.sql actually run, and an
+# EXPLAIN-based advisor that shows which index (if any) each of those queries uses.
+# db/02_indexes.sql only has single-column indexes; the real predicates are composite (owner/source + date
+# range), the opportunity panels need status/stage/value next to the date, and the jobs look rows up by
+# updated_at. The migration creates what is missing and then drops the single-column indexes that a new
+# composite index makes redundant (same leading column), so write cost does not simply pile up.
+#
+#   python app/index_advisor.py migrate                 # create missing indexes, drop superseded ones
+#   python app/index_advisor.py explain                 # plan of every app query and report, full scans flagged
+#   python app/index_advisor.py explain --fail-on-scan  # exit 1 if a large table is fully scanned (for CI)
+import argparse
+import json
+import os
+import re
+import sys
+from collections import namedtuple
+from datetime import date, timedelta
+
+import pandas as pd
+from sqlalchemy import bindparam, create_engine, event, inspect, text
+from sqlalchemy.exc import DBAPIError
+
+import query_layer
+import rollups
+import stage_analytics
+import write_service
+from query_layer import Filters
+from table_cache import TABLE_SPECS
+
+QUERIES_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "db", "queries.sql")
+
+Index = namedtuple("Index", "name table columns serves")
+
+# Column lists are in predicate order: equality columns first, then the range column, then the columns the
+# query only reads, so the index covers it (InnoDB secondary indexes carry the primary key as well).
+INDEXES = [
+    Index("idx_leads_owner_created", "leads", ("owner_id", "created_at"),
+          "owner + date filtered lead counts, weekly leads, top sources"),
+    Index("idx_leads_source_created", "leads", ("source_id", "created_at"),
+          "source + date filtered lead counts, report F"),
+    Index("idx_leads_email", "leads", ("email",),
+          "lead import dedupe and id lookup by email (write_service)"),
+    Index("idx_leads_updated", "leads", ("updated_at",),
+          "table cache refresh and rollup change detection (updated_at watermark)"),
+    Index("idx_opps_created_cover", "opportunities", ("created_at", "status", "stage_id", "value"),
+          "date filtered KPIs and pipeline by stage, index-only"),
+    Index("idx_opps_owner_created", "opportunities", ("owner_id", "created_at", "status", "stage_id", "value"),
+          "owner + date filtered KPIs and pipeline by stage, index-only"),
+    Index("idx_opps_status_stage", "opportunities", ("status", "stage_id", "value"),
+          "reports C and E (pipeline by stage, win rate), index-only"),
+    Index("idx_opps_lead", "opportunities", ("lead_id",),
+          "lead -> opportunity join for top sources, report F and the stage history source filter"),
+    Index("idx_opps_updated", "opportunities", ("updated_at",),
+          "table cache refresh and rollup change detection (updated_at watermark)"),
+    Index("idx_activities_created_id", "activities", ("created_at DESC", "id DESC"),
+          "activity feed pages, newest first, keyset on (created_at, id)"),
+    Index("idx_history_opp_entered", "opportunity_stage_history", ("opportunity_id", "entered_at"),
+          "stage history per opportunity in entry order"),
+]
+
+# Old single-column index -> the new index whose leading column makes it redundant
+SUPERSEDED = {
+    "idx_leads_owner": "idx_leads_owner_created",
+    "idx_leads_source": "idx_leads_source_created",
+    "idx_opps_owner": "idx_opps_owner_created",
+    "idx_activities_created": "idx_activities_created_id",
+}
+
+# Dimension tables hold a handful of rows; scanning them is expected and never flagged
+SMALL_TABLES = {"users", "sources", "stages", "rollup_state"}
+
+
+def _column_names(index):
+    return [c.split()[0] for c in index.columns]
+
+
+def existing_indexes(conn):
+    """{index name: (table, [columns])} for the tables the migration touches."""
+    insp = inspect(conn)
+    found = {}
+    for table in sorted({i.table for i in INDEXES}):
+        for ix in insp.get_indexes(table):
+            found[ix["name"]] = (table, [c for c in ix["column_names"] if c])
+    return found
+
+
+def migrate(engine, drop_superseded=True, log=print):
+    """Create the missing INDEXES and drop the SUPERSEDED ones; returns the list of actions taken."""
+    actions = []
+    with engine.begin() as conn:
+        current = existing_indexes(conn)
+        by_columns = {(table, tuple(cols)): name for name, (table, cols) in current.items()}
+        for ix in INDEXES:
+            same = by_columns.get((ix.table, tuple(_column_names(ix))))
+            if ix.name in current or same:
+                continue
+            conn.exec_driver_sql(f"CREATE INDEX {ix.name} ON {ix.table} ({', '.join(ix.columns)})")
+            actions.append(f"created {ix.name} ON {ix.table} ({', '.join(ix.columns)})")
+            current[ix.name] = (ix.table, _column_names(ix))
+        if drop_superseded:
+            for old, new in SUPERSEDED.items():
+                if old in current and new in current:
+                    table = current[old][0]
+                    stmt = f"DROP INDEX {old} ON {table}" if conn.dialect.name == "mysql" else f"DROP INDEX {old}"
+                    conn.exec_driver_sql(stmt)
+                    actions.append(f"dropped {old} (superseded by {new})")
+        if actions:
+            # Fresh statistics, or the planner may keep ignoring the new indexes
+            if conn.dialect.name == "mysql":
+                for table in sorted({i.table for i in INDEXES}):
+                    conn.exec_driver_sql(f"ANALYZE TABLE {table}")
+            elif conn.dialect.name == "sqlite":
+                conn.exec_driver_sql("ANALYZE")
+    for action in actions:
+        log(action)
+    return actions
+
+
+def parse_reports(path=QUERIES_SQL):
+    """Split queries.sql into (name, sql) pairs, named after the '-- X. Title' comment above each statement."""
+    with open(path, encoding="utf-8") as fh:
+        body = fh.read()
+    reports = []
+    for stmt in body.split(";"):
+        titles = re.findall(r"^--\s*([A-Z](?: \(rollup\))?)\.\s*(.+)$", stmt, flags=re.M)
+        sql = "\n".join(line for line in stmt.splitlines() if not line.lstrip().startswith("--")).strip()
+        if sql and titles:
+            key, title = titles[-1]
+            reports.append((f"{key}. {title.strip()}", sql))
+    return reports
+
+
+def _captured(engine, fn):
+    # The driver-level statements (and parameters) that fn() sends through `engine`
+    statements = []
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+    event.listen(engine, "before_cursor_execute", before)
+    try:
+        with engine.connect() as conn:
+            fn(conn)
+    finally:
+        event.remove(engine, "before_cursor_execute", before)
+    return statements
+
+
+def sample_filters(engine, days=90):
+    """The filter combinations the sidebar produces: none, owner only, source only, owner and source."""
+    with engine.connect() as conn:
+        owner = conn.execute(text("SELECT name FROM users ORDER BY id")).scalar()
+        source = conn.execute(text("SELECT name FROM sources ORDER BY id")).scalar()
+    window = {"date_min": date.today() - timedelta(days=days), "date_max": date.today()}
+    variants = {"all": Filters(**window)}
+    if owner:
+        variants["owner"] = Filters(owner=owner, **window)
+    if source:
+        variants["source"] = Filters(source=source, **window)
+    if owner and source:
+        variants["owner+source"] = Filters(owner=owner, source=source, **window)
+    return variants
+
+
+def app_statements(engine, days=90):
+    """(name, driver sql, parameters) for the panel queries under each filter variant, plus the job lookups."""
+    panels = {
+        "kpis": query_layer.kpis,
+        "weekly_leads": query_layer.weekly_leads,
+        "pipeline_by_stage": query_layer.pipeline_by_stage,
+        "top_sources": query_layer.top_sources,
+        "recent_activities": query_layer.recent_activities,
+        "activity_page (cursor)": lambda conn, f: query_layer.activity_page(
+            conn, f, after=query_layer.encode_cursor(pd.Timestamp.now().floor("s"), 0)),
+        "load_stage_history": stage_analytics.load_stage_history,
+    }
+    out = []
+    for variant, f in sample_filters(engine, days).items():
+        for name, fn in panels.items():
+            captured = _captured(engine, lambda conn: fn(conn, f))
+            for n, (sql, params) in enumerate(captured, 1):
+                suffix = f" #{n}" if len(captured) > 1 else ""
+                out.append((f"{name}{suffix} [{variant}]", sql, params))
+
+    # Incremental refreshes: the table cache delta reads and the rollup change detection
+    wm = {"wm": pd.Timestamp.now().floor("s").to_pydatetime()}
+    for name, (query, alias, watermark_col) in TABLE_SPECS.items():
+        if watermark_col:
+            sql = f"{query} WHERE {alias}.{watermark_col} >= :wm"
+            out.extend((f"table_cache.refresh({name})", s, p)
+                       for s, p in _captured(engine, lambda conn: conn.execute(text(sql), wm).fetchall()))
+    for name, sql, params in (("rollups: changed lead days", rollups.LEAD_DAYS_CHANGED, wm),
+                              ("rollups: changed opportunity days", rollups.OPP_DAYS_CHANGED,
+                               {"owm": wm["wm"], "lwm": wm["wm"]})):
+        out.extend((name, s, p) for s, p in _captured(engine, lambda conn: conn.execute(text(sql), params).fetchall()))
+
+    # Batched writes: the set-based lookups run once per batch of BATCH_SIZE keys
+    emails = {"emails": [f"lead{i}@example.com" for i in range(1, 51)]}
+    ids = {"ids": list(range(1, 51))}
+    for name, sql, params in (("write_service: existing emails", write_service.EXISTING_EMAILS, emails),
+                              ("write_service: lead ids by email", write_service.LEAD_IDS, emails),
+                              ("write_service: convertible leads", write_service.CONVERTIBLE_LEADS, ids),
+                              ("write_service: new opportunities", write_service.NEW_OPPORTUNITIES, ids)):
+        key = next(iter(params))
+        out.extend((name, s, p) for s, p in _captured(
+            engine, lambda conn: conn.execute(text(sql).bindparams(bindparam(key, expanding=True)), params).fetchall()))
+    return out
+
+
+def report_statements():
+    # The reports take no parameters, so their text goes to EXPLAIN as is
+    return [(f"report {name}", sql, None) for name, sql in parse_reports()]
+
+
+def _sqlite_step(detail):
+    # "SCAN l", "SCAN o USING COVERING INDEX ix", "SEARCH l USING INDEX ix (owner_id=? AND created_at>?)",
+    # "SEARCH o USING AUTOMATIC COVERING INDEX (lead_id=?)" (a temporary index built for this one query), ...
+    m = re.match(r"(SCAN|SEARCH) (?:TABLE )?(\w+)(?: AS \w+)?(?: USING (?:(AUTOMATIC) )?(?:COVERING )?"
+                 r"(?:INDEX (\w+)|INTEGER PRIMARY KEY|PRIMARY KEY|INDEX))?", detail)
+    if not m:
+        return None
+    op, table, automatic, index = m.groups()
+    if automatic:
+        access = "automatic index"
+    elif op == "SEARCH":
+        access = "index lookup"
+    elif "USING" in detail:
+        access = "full index scan"
+    else:
+        access = "full table scan"
+    return {"table": table, "access": access, "index": index or ("PRIMARY" if "PRIMARY KEY" in detail else None),
+            "detail": detail}
+
+
+def explain(conn, sql, params=None):
+    """Plan steps for one driver-level statement: [{table, access, index, detail}]."""
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params or ()).fetchall()
+        steps = [_sqlite_step(r[-1]) for r in rows]
+        return [s for s in steps if s]
+    rows = conn.exec_driver_sql(f"EXPLAIN {sql}", params or {}).mappings().fetchall()
+    access = {"ALL": "full table scan", "index": "full index scan"}
+    return [{"table": r["table"], "access": access.get(r["type"], "index lookup" if r["key"] else r["type"]),
+             "index": r["key"], "detail": f"type={r['type']} key={r['key']} rows={r['rows']} {r['Extra'] or ''}"}
+            for r in rows if r["table"]]
+
+
+def _aliases(sql):
+    # EXPLAIN names tables by their alias (l, o, h, ...); map aliases back to table names
+    pairs = re.findall(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|JOIN\b|LEFT\b|GROUP\b)(\w+))?", sql,
+                       flags=re.I)
+    return {alias or table: table for table, alias in pairs}
+
+
+def advise(engine, days=90, include_reports=True):
+    """One row per plan step of every app query (and report), with full scans of large tables flagged."""
+    statements = app_statements(engine, days)
+    if include_reports:
+        statements += report_statements()
+    rows = []
+    with engine.connect() as conn:
+        tables = set(inspect(conn).get_table_names())
+        for name, sql, params in statements:
+            aliases = _aliases(sql)
+            try:
+                steps = explain(conn, sql, params)
+            except DBAPIError as exc:
+                # e.g. the rollup reports before db/03_rollups.sql was applied
+                rows.append({"query": name, "access": "error", "detail": str(exc.orig), "flag": ""})
+                conn.rollback()
+                continue
+            for step in steps:
+                table = aliases.get(step["table"], step["table"])
+                # CTEs and subqueries also show up as scans; only real, large tables are flagged
+                large = table in tables and table not in SMALL_TABLES
+                flag = {"full table scan": "FULL SCAN", "automatic index": "NO INDEX"}.get(step["access"], "")
+                rows.append({"query": name, **step, "flag": flag if large else ""})
+    return pd.DataFrame(rows, columns=["query", "table", "access", "index", "detail", "flag"])
+
+
+def index_usage(plan):
+    """How many plan steps use each migrated index; an index nothing uses does not pay for itself."""
+    used = plan["index"].value_counts()
+    return pd.DataFrame([
+        {"index": ix.name, "table": ix.table, "steps": int(used.get(ix.name, 0)), "serves": ix.serves}
+        for ix in INDEXES
+    ])
+
+
+def main():
+    from db_config import database_url, load_env
+
+    parser = argparse.ArgumentParser(description="Composite index migration and EXPLAIN-based index advisor")
+    parser.add_argument("command", choices=["migrate", "explain"])
+    parser.add_argument("--keep-superseded", action="store_true", help="migrate: do not drop old indexes")
+    parser.add_argument("--days", type=int, default=90, help="explain: dashboard date window for the panels")
+    parser.add_argument("--no-reports", action="store_true", help="explain: skip db/queries.sql")
+    parser.add_argument("--fail-on-scan", action="store_true", help="explain: exit 1 when a full scan is flagged")
+    parser.add_argument("--output", help="explain: also write the plan as JSON")
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL / MYSQL_* from .env")
+    args = parser.parse_args()
+
+    load_env()
+    engine = create_engine(args.database_url or database_url(), pool_pre_ping=True)
+    if engine.dialect.name == "sqlite":
+        from local_db import register_mysql_functions
+        event.listen(engine, "connect", register_mysql_functions)
+
+    if args.command == "migrate":
+        actions = migrate(engine, drop_superseded=not args.keep_superseded)
+        if not actions:
+            print("indexes are up to date")
+        return
+
+    plan = advise(engine, args.days, include_reports=not args.no_reports)
+    with pd.option_context("display.max_rows", None, "display.max_colwidth", 70, "display.width", 200):
+        shown = plan.assign(query=plan["query"].str.slice(0, 50)).fillna("")
+        print(shown[["query", "table", "access", "index", "flag"]].to_string(index=False))
+        print()
+        print(index_usage(plan).to_string(index=False))
+    flagged = plan[plan["flag"] != ""]
+    print(f"\n{plan['query'].nunique()} statements, {len(flagged)} plan step(s) flagged")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(plan.to_dict(orient="records"), fh, indent=2, default=str)
+    if args.fail_on_scan and not flagged.empty:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# app/instrumentation.py
+# Always-on timing for the dashboard: every SQL statement (through SQLAlchemy engine events), each panel's
+# data and render stages, and the table cache's hit / refresh / full-load outcomes. Events are small dicts
+# kept in a bounded in-memory ring (for the debug sidebar), logged at DEBUG on the "crm.metrics" logger and,
+# with CRM_METRICS_FILE set, appended to a JSON-lines file that can be summarised offline:
+#
+#   CRM_METRICS_FILE=metrics.jsonl streamlit run app/streamlit_app.py
+#   python app/instrumentation.py metrics.jsonl                 # p50/p95/max per (kind, name)
+#   python app/instrumentation.py metrics.jsonl --kind query --top 20
+#
+# Events carry the tags of the context they were recorded in (the Streamlit run, the panel a query belongs
+# to); work handed to a thread pool keeps them when it is submitted with submit_in_context().
+import argparse
+import contextvars
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+from sqlalchemy import event
+
+log = logging.getLogger("crm.metrics")
+
+_tags = contextvars.ContextVar("crm_metrics_tags", default={})
+
+# Statement text is kept without parameter values, whitespace-collapsed and cut to this length
+MAX_SQL = 1000
+
+
+def tag(**tags):
+    """Add tags to every event recorded from now on in the current context (e.g. the Streamlit run)."""
+    _tags.set({**_tags.get(), **tags})
+
+
+@contextmanager
+def tagged(**tags):
+    token = _tags.set({**_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+def submit_in_context(executor, fn, *args):
+    """executor.submit(fn, *args), run with a copy of the caller's tags."""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def result_rows(result):
+    if hasattr(result, "shape"):
+        return int(result.shape[0])
+    if hasattr(result, "rows") and hasattr(result.rows, "shape"):
+        return int(result.rows.shape[0])
+    return None
+
+
+def _statement_name(sql):
+    # "SELECT leads", "INSERT opportunities", ...: the verb and the first table it touches
+    verb = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else "?"
+    m = re.search(r"\b(?:FROM|INTO|UPDATE)\s+[`\"]?(\w+)", sql, re.IGNORECASE)
+    return f"{verb} {m.group(1)}" if m else verb
+
+
+class Metrics:
+    """Process-wide event sink: a ring of recent events plus an optional JSON-lines file."""
+
+    def __init__(self, path=None, maxlen=20_000):
+        self.events = deque(maxlen=maxlen)
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1, encoding="utf-8") if path else None
+
+    def record(self, kind, name, seconds, **fields):
+        event_ = {"ts": round(time.time(), 3), "kind": kind, "name": name, "ms": round(seconds * 1000, 3),
+                  **_tags.get(), **fields}
+        with self._lock:
+            self.events.append(event_)
+            if self._file is not None:
+                self._file.write(json.dumps(event_, default=str) + "\n")
+        log.debug("%s %s %.1f ms", kind, name, event_["ms"])
+
+    @contextmanager
+    def timer(self, kind, name, **fields):
+        """Time the block; it may add fields to the yielded dict. Exceptions are recorded as `error`."""
+        extra = {}
+        started = time.perf_counter()
+        try:
+            yield extra
+        except BaseException as exc:
+            extra["error"] = type(exc).__name__
+            raise
+        finally:
+            self.record(kind, name, time.perf_counter() - started, **fields, **extra)
+
+    def frame(self, **match):
+        """Recorded events as a DataFrame, optionally only those whose fields equal `match`."""
+        with self._lock:
+            events = list(self.events)
+        if match:
+            events = [e for e in events if all(e.get(k) == v for k, v in match.items())]
+        return pd.DataFrame(events)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def summarize(events):
+    """count / total / p50 / p95 / max milliseconds per (kind, name), slowest total first."""
+    if events.empty:
+        return pd.DataFrame(columns=["kind", "name", "count", "total_ms", "p50_ms", "p95_ms", "max_ms"])
+    g = events.groupby(["kind", "name"])["ms"]
+    out = pd.DataFrame({
+        "count": g.size(),
+        "total_ms": g.sum(),
+        "p50_ms": g.median(),
+        "p95_ms": g.quantile(0.95),
+        "max_ms": g.max(),
+    }).round(1)
+    return out.reset_index().sort_values("total_ms", ascending=False, ignore_index=True)
+
+
+def instrument_engine(engine, metrics, label=None):
+    """Record every statement on `engine`: text, duration and row count (and `label` as `db`, if given).
+
+    Duration runs until the driver returns from execute, which includes the fetch for pymysql's buffered
+    cursors but not for sqlite3, which streams rows as they are fetched. Row counts come from the cursor:
+    rows affected for writes and rows returned for buffered MySQL reads; sqlite3 does not report SELECT
+    row counts, so they are empty on the local stand-in.
+    """
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("crm_query_started", []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["crm_query_started"].pop()
+        rowcount = getattr(cursor, "rowcount", -1)
+        metrics.record(
+            "query", _statement_name(statement), time.perf_counter() - started,
+            sql=" ".join(statement.split())[:MAX_SQL],
+            rows=rowcount if rowcount is not None and rowcount >= 0 else None,
+            batch=len(parameters) if executemany else None,
+            **({"db": label} if label else {}),
+        )
+
+    def failed(context):
+        stack = context.connection.info.get("crm_query_started") if context.connection is not None else None
+        if stack:
+            started = stack.pop()
+            metrics.record("query", _statement_name(context.statement or ""), time.perf_counter() - started,
+                           sql=" ".join((context.statement or "").split())[:MAX_SQL],
+                           error=type(context.original_exception).__name__, **({"db": label} if label else {}))
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    event.listen(engine, "handle_error", failed)
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise a CRM_METRICS_FILE (JSON lines)")
+    parser.add_argument("path")
+    parser.add_argument("--kind", help="only this kind (query, panel_data, panel_render, table_cache, page)")
+    parser.add_argument("--top", type=int, default=30)
+    args = parser.parse_args()
+
+    events = pd.read_json(args.path, lines=True)
+    if args.kind:
+        events = events[events["kind"] == args.kind]
+    with pd.option_context("display.width", 200, "display.max_colwidth", 80):
+        print(summarize(events).head(args.top).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
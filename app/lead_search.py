@@ -0,0 +1,262 @@
+# app/lead_search.py
+# In-memory typeahead index over lead name, email and phone for the lead pickers.
+# Every lead contributes a few search tokens: its name words, its email and the email's parts, and its phone
+# digits plus their last 10/7/4 digits. The tokens live in one sorted array of fixed-width UTF-8 prefixes, so
+# a query term is a binary-search range (np.searchsorted) rather than a scan over every lead, and candidates
+# are scored with array operations. Changed leads go to a small delta segment on top of the sorted base and
+# their old positions are tombstoned; the base is rebuilt once the delta grows or leads have been deleted.
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Bytes of each token kept in the sorted array; longer query terms are verified against the full text
+TOKEN_BYTES = 16
+
+# Weight of a full-token match per field; a prefix match scores half
+W_NAME, W_EMAIL, W_EMAIL_PART, W_PHONE = 4.0, 3.0, 2.0, 2.0
+
+RESULT_COLUMNS = ["id", "name", "email", "phone", "status", "owner_name", "source_name", "created_at"]
+
+_PHONE_LIKE = re.compile(r"[\d\s()+.\-]+")
+
+
+def _arrow(series):
+    # The cached text columns are already Arrow-backed, so this is normally zero-copy
+    values = pa.array(series.astype("string[pyarrow]").array)
+    return values.combine_chunks() if isinstance(values, pa.ChunkedArray) else values
+
+
+def _text(series):
+    return pc.utf8_lower(_arrow(series))
+
+
+def _digits(series):
+    return pc.replace_substring_regex(_arrow(series), r"\D", "")
+
+
+def _tokens(rows, offset=0):
+    """Parallel (token, position, weight) arrays for `rows`, whose positions start at `offset`."""
+    name, email, digits = _text(rows["name"]), _text(rows["email"]), _digits(rows["phone"])
+    fields = [
+        (pc.utf8_split_whitespace(name), W_NAME),
+        (pc.split_pattern_regex(email, r"[@._+\-]"), W_EMAIL_PART),
+        (email, W_EMAIL),
+        # Full digits plus the usual local lengths, so '5551234' finds '+1 (555) 123-4567'
+        (digits, W_PHONE),
+        (pc.utf8_slice_codeunits(digits, -10), W_PHONE),
+        (pc.utf8_slice_codeunits(digits, -7), W_PHONE),
+        (pc.utf8_slice_codeunits(digits, -4), W_PHONE),
+    ]
+    tokens, positions, weights = [], [], []
+    for values, weight in fields:
+        if pa.types.is_list(values.type):
+            parents = pc.list_parent_indices(values).to_numpy()
+            values = pc.list_flatten(values)
+        else:
+            parents = np.arange(len(values))
+        keep = pc.fill_null(pc.greater(pc.binary_length(values), 0), False)
+        tokens.append(values.filter(keep))
+        positions.append(parents[keep.to_numpy(zero_copy_only=False)] + offset)
+        weights.append(np.full(len(tokens[-1]), weight, dtype=np.float32))
+    return pa.concat_arrays(tokens), np.concatenate(positions), np.concatenate(weights)
+
+
+def _key(term):
+    return term.encode("utf-8")[:TOKEN_BYTES]
+
+
+class _Segment:
+    """Token prefixes sorted for range lookups, with the row position and weight of each token."""
+
+    def __init__(self, tokens, positions, weights):
+        prefixes = pc.binary_slice(tokens.cast(pa.binary()), 0, TOKEN_BYTES)
+        keys = prefixes.to_numpy(zero_copy_only=False).astype(f"S{TOKEN_BYTES}")
+        # Sort by key, then keep one entry per (key, row): its best weight
+        order = np.lexsort((-weights, positions, keys))
+        keys, positions, weights = keys[order], positions[order], weights[order]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = (keys[1:] != keys[:-1]) | (positions[1:] != positions[:-1])
+        self.keys = keys[first]
+        self.positions = positions[first].astype(np.int32)
+        self.weights = weights[first]
+
+    def lookup(self, key):
+        """Positions and weights of the tokens starting with `key`; exact token matches keep the full weight."""
+        lo = np.searchsorted(self.keys, key, side="left")
+        hi = np.searchsorted(self.keys, key + b"\xff" * (TOKEN_BYTES - len(key)), side="right")
+        weights = self.weights[lo:hi]
+        if len(key) < TOKEN_BYTES:
+            weights = np.where(self.keys[lo:hi] == key, weights, weights / 2)
+        return self.positions[lo:hi], weights
+
+
+class LeadSearchIndex:
+    """Process-wide lead lookup; sync() it with the cached leads frame, then search() from any session."""
+
+    def __init__(self, delta_ratio=0.1):
+        self.delta_ratio = delta_ratio
+        self.version = None
+        self._lock = threading.Lock()
+        self._state = None
+
+    def build(self, leads):
+        rows = leads[[c for c in RESULT_COLUMNS + ["updated_at"] if c in leads.columns]].reset_index(drop=True)
+        self._state = {
+            "base_rows": rows,
+            "delta_rows": rows.iloc[:0],
+            "base": _Segment(*_tokens(rows)),
+            "delta": None,
+            "alive": np.ones(len(rows), dtype=bool),
+            "ids": rows["id"].to_numpy(dtype=np.int64),
+            "updated": rows["updated_at"].to_numpy(dtype="datetime64[ns]") if "updated_at" in rows else None,
+            "position": pd.Series(np.arange(len(rows)), index=rows["id"].to_numpy()),
+            "watermark": rows["updated_at"].max() if "updated_at" in rows and len(rows) else None,
+        }
+
+    def _apply_delta(self, leads):
+        # Returns False when a full rebuild is the better option
+        st = self._state
+        if st is None or st["watermark"] is None or pd.isna(st["watermark"]):
+            return False
+        changed = leads[leads["updated_at"] >= st["watermark"]]
+        if changed.empty:
+            return len(leads) == int(st["alive"].sum())
+        # The watermark is inclusive: skip rows already indexed with the same updated_at
+        known = st["position"].reindex(changed["id"].to_numpy())
+        changed_at = changed["updated_at"].to_numpy(dtype="datetime64[ns]")
+        seen = known.notna().to_numpy()
+        stale = np.ones(len(changed), dtype=bool)
+        stale[seen] = st["updated"][known[seen].to_numpy(dtype=np.int64)] != changed_at[seen]
+        changed, known, changed_at = changed[stale], known[stale], changed_at[stale]
+        n_base = len(st["base_rows"])
+        delta_rows = pd.concat(
+            [st["delta_rows"], changed[st["base_rows"].columns].reset_index(drop=True)], ignore_index=True
+        )
+        if len(delta_rows) > self.delta_ratio * max(n_base, 1):
+            return False
+        alive = np.append(st["alive"], np.ones(len(changed), dtype=bool))
+        alive[known.dropna().to_numpy(dtype=np.int64)] = False
+        if int(alive.sum()) != len(leads):
+            return False  # deletes: only a rebuild drops their tokens
+        new_pos = np.arange(len(st["alive"]), len(alive))
+        position = st["position"].drop(known.dropna().index, errors="ignore")
+        position = pd.concat([position, pd.Series(new_pos, index=changed["id"].to_numpy())])
+        self._state = {
+            **st,
+            "delta_rows": delta_rows,
+            "delta": _Segment(*_tokens(delta_rows, offset=n_base)),
+            "alive": alive,
+            "ids": np.append(st["ids"], changed["id"].to_numpy(dtype=np.int64)),
+            "updated": np.append(st["updated"], changed_at),
+            "position": position,
+            "watermark": leads["updated_at"].max(),
+        }
+        return True
+
+    def sync(self, leads, version=None):
+        """Bring the index up to date with `leads` (the cached frame); cheap when its version is unchanged."""
+        with self._lock:
+            if version is not None and version == self.version and self._state is not None:
+                return
+            if "updated_at" not in leads.columns or not self._apply_delta(leads):
+                self.build(leads)
+            self.version = version
+
+    def search(self, query, k=10, filters=None):
+        """Top-k leads matching every term of `query` (prefixes of name words, email or phone digits).
+
+        An empty query returns the k newest leads. With `filters` (query_layer.Filters) only leads inside the
+        sidebar's owner / source / date window are candidates.
+        """
+        st = self._state
+        if st is None:
+            return pd.DataFrame(columns=RESULT_COLUMNS + ["score"])
+        alive, ids = st["alive"], st["ids"]
+        if filters is not None:
+            alive = alive & np.concatenate([_within(st["base_rows"], filters), _within(st["delta_rows"], filters)])
+        terms = _terms(query)
+        if not terms:
+            cand = np.flatnonzero(alive)
+            score = np.zeros(len(alive), dtype=np.float32)
+        else:
+            score = None
+            for term in terms:
+                key = _key(term)
+                best = np.zeros(len(alive), dtype=np.float32)
+                for segment in (st["base"], st["delta"]):
+                    if segment is None:
+                        continue
+                    pos, w = segment.lookup(key)
+                    order = np.argsort(w, kind="stable")  # with repeated positions the last (best) write wins
+                    best[pos[order]] = np.maximum(best[pos[order]], w[order])
+                score = best if score is None else np.where((score > 0) & (best > 0), score + best, 0)
+            score[~alive] = 0
+            cand = np.flatnonzero(score)
+            long_terms = [t for t in terms if len(t.encode("utf-8")) >= TOKEN_BYTES]
+            if long_terms and len(cand):
+                cand = cand[self._contains(st, cand, long_terms)]
+        # Best score first, newest lead (highest id) among equals: one int64 sort key (scores are multiples of
+        # 0.5), so top-k is an O(n) argpartition instead of sorting every candidate
+        rank = (score[cand] * 2).astype(np.int64) << 32 | ids[cand]
+        if len(cand) > k:
+            keep = np.argpartition(-rank, k)[:k]
+            cand, rank = cand[keep], rank[keep]
+        top = cand[np.argsort(-rank)]
+        return self._rows(st, top).assign(score=score[top])
+
+    @staticmethod
+    def _rows(st, positions):
+        n_base = len(st["base_rows"])
+        in_base = positions < n_base
+        rows = pd.concat([
+            st["base_rows"].iloc[positions[in_base]],
+            st["delta_rows"].iloc[positions[~in_base] - n_base],
+        ], ignore_index=True)
+        # Base hits come first, then delta hits: put them back in `positions` order
+        order = np.argsort(np.concatenate([np.flatnonzero(in_base), np.flatnonzero(~in_base)]))
+        return rows.iloc[order].reset_index(drop=True)[[c for c in RESULT_COLUMNS if c in rows.columns]]
+
+    def _contains(self, st, cand, terms):
+        rows = self._rows(st, cand)
+        fields = [_text(rows["name"]), _text(rows["email"]), _digits(rows["phone"])]
+        text = pc.binary_join_element_wise(*fields, pa.scalar(" ", fields[0].type), null_handling="replace")
+        mask = np.ones(len(rows), dtype=bool)
+        for term in terms:
+            mask &= pc.fill_null(pc.match_substring(text, term), False).to_numpy(zero_copy_only=False)
+        return mask
+
+    def memory(self):
+        st = self._state
+        if st is None:
+            return 0
+        segments = [s for s in (st["base"], st["delta"]) if s is not None]
+        return sum(s.keys.nbytes + s.positions.nbytes + s.weights.nbytes for s in segments)
+
+
+def _within(rows, f):
+    # Same predicates as query_layer.filter_frame: created_at from date_min 00:00 to date_max + 1 day 00:00
+    mask = np.ones(len(rows), dtype=bool)
+    if f.date_min is not None:
+        mask &= (rows["created_at"] >= pd.Timestamp(f.date_min)).to_numpy(dtype=bool, na_value=False)
+    if f.date_max is not None:
+        upper = pd.Timestamp(f.date_max) + pd.Timedelta(days=1)
+        mask &= (rows["created_at"] <= upper).to_numpy(dtype=bool, na_value=False)
+    if f.owner != "All":
+        mask &= (rows["owner_name"] == f.owner).to_numpy(dtype=bool, na_value=False)
+    if f.source != "All":
+        mask &= (rows["source_name"] == f.source).to_numpy(dtype=bool, na_value=False)
+    return mask
+
+
+def _terms(query):
+    query = (query or "").strip().lower()
+    if not query:
+        return []
+    # A phone number is one term whatever its spacing or punctuation
+    if _PHONE_LIKE.fullmatch(query) and any(c.isdigit() for c in query):
+        return [re.sub(r"\D", "", query)]
+    return query.split()
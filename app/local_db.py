@@ -0,0 +1,58 @@
+# app/local_db.py
+# SQLite stand-in for the MySQL database, for local runs of the jobs and benchmarks without a server.
+import os
+from datetime import date, datetime
+
+from sqlalchemy import create_engine, event
+
+SQLITE_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "db", "sqlite_schema.sql")
+
+
+def apply_sql_file(engine, path):
+    # Statements are ';'-separated; '--' comment lines are dropped first. `USE <db>` lines in the
+    # MySQL scripts are skipped so the same files can be applied to SQLite.
+    with open(path, encoding="utf-8") as fh:
+        body = "\n".join(line for line in fh if not line.lstrip().startswith("--"))
+    with engine.begin() as conn:
+        for stmt in body.split(";"):
+            if stmt.strip() and not stmt.strip().upper().startswith("USE "):
+                conn.exec_driver_sql(stmt)
+
+
+def _day(value):
+    return None if value is None else date.fromisoformat(str(value)[:10])
+
+
+def _mysql_week(value, mode=0):
+    # Mode 1 (Monday-based, week 1 has >= 4 days); the only mode db/queries.sql uses
+    d = _day(value)
+    if d is None:
+        return None
+    iso_year, iso_week, _ = d.isocalendar()
+    if iso_year < d.year:
+        return 0
+    if iso_year > d.year:
+        return 53
+    return iso_week
+
+
+def _datediff(a, b):
+    a, b = _day(a), _day(b)
+    return None if a is None or b is None else (a - b).days
+
+
+def register_mysql_functions(dbapi_conn, _record=None):
+    """Provide the MySQL date functions used by db/queries.sql on a sqlite3 connection."""
+    dbapi_conn.create_function("YEAR", 1, lambda v: None if v is None else _day(v).year, deterministic=True)
+    dbapi_conn.create_function("WEEK", 1, _mysql_week, deterministic=True)
+    dbapi_conn.create_function("WEEK", 2, _mysql_week, deterministic=True)
+    dbapi_conn.create_function("DATEDIFF", 2, _datediff, deterministic=True)
+    dbapi_conn.create_function("NOW", 0, lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+
+def sqlite_engine(path, create_schema=True):
+    engine = create_engine(f"sqlite:///{path}")
+    event.listen(engine, "connect", register_mysql_functions)
+    if create_schema:
+        apply_sql_file(engine, SQLITE_SCHEMA)
+    return engine
@@ -0,0 +1,237 @@
+# app/panel_loader.py
+# Concurrent panel queries over the process-wide, explicitly sized connection pool (db_config.pool_options).
+# Every panel query runs on a worker thread with its own pooled connection, so a page costs about as much
+# as its slowest query instead of the sum of all of them, and the dashboard renders each panel as soon as
+# its data arrives. Each query has a timeout, counted from when it starts running (not while it waits for a
+# worker). On timeout, or when a batch is abandoned (a Streamlit rerun), the statement is interrupted in the
+# database: sqlite3's interrupt() on the local stand-in, KILL QUERY on MySQL, which also gets
+# MAX_EXECUTION_TIME as a server-side backstop. Finished results go to a shared, memory-bounded LRU
+# (result_cache.ResultCache) keyed by panel, normalized filters and the version of the data they were read from.
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from sqlalchemy.exc import DBAPIError
+
+from instrumentation import result_rows, submit_in_context, tagged
+from result_cache import MISS, ResultCache
+
+log = logging.getLogger(__name__)
+
+# MySQL: 3024 = MAX_EXECUTION_TIME exceeded, 1317 = query interrupted (KILL QUERY)
+_MYSQL_TIMEOUT_ERRORS = (3024, 1317)
+
+
+class PanelTimeout(Exception):
+    pass
+
+
+class PanelCancelled(Exception):
+    pass
+
+
+class _Query:
+    """One panel query, fn(conn, *args) on a pooled connection, which another thread can interrupt."""
+
+    def __init__(self, engine, name, fn, args, timeout):
+        self.engine = engine
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.timeout = timeout
+        self.state = None  # None, "timeout" or "cancelled"
+        self._server = None  # the engine the connection came from (engine may route to replicas)
+        self._dbapi = None
+        self._mysql_thread = None
+        self._lock = threading.Lock()
+
+    def _check(self):
+        if self.state == "timeout":
+            raise PanelTimeout(f"{self.name} took longer than {self.timeout:g}s")
+        if self.state == "cancelled":
+            raise PanelCancelled(self.name)
+
+    def run(self):
+        self._check()
+        with self.engine.connect() as conn:
+            mysql = conn.dialect.name == "mysql"
+            dbapi = conn.connection.dbapi_connection
+            if mysql and self.timeout:
+                conn.exec_driver_sql(f"SET SESSION MAX_EXECUTION_TIME = {int(self.timeout * 1000)}")
+            with self._lock:
+                self._check()
+                self._dbapi = dbapi
+                self._server = conn.engine
+                self._mysql_thread = dbapi.thread_id() if mysql else None
+            timer = None
+            if self.timeout:
+                timer = threading.Timer(self.timeout, self.cancel, args=("timeout",))
+                timer.daemon = True
+                timer.start()
+            try:
+                return self.fn(conn, *self.args)
+            except DBAPIError as exc:
+                code = exc.orig.args[0] if mysql and exc.orig is not None and exc.orig.args else None
+                if code in _MYSQL_TIMEOUT_ERRORS and self.state is None:
+                    self.state = "timeout"
+                self._check()
+                raise
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                with self._lock:
+                    self._dbapi = None
+                if mysql and self.timeout:
+                    try:
+                        conn.exec_driver_sql("SET SESSION MAX_EXECUTION_TIME = 0")
+                    except DBAPIError:
+                        conn.invalidate()
+
+    def cancel(self, reason="cancelled"):
+        """Stop the query: before it starts it never runs; while it runs the statement is interrupted."""
+        # Interrupt under the lock: run() clears _dbapi under it too, so a connection that has gone back
+        # to the pool (and may be running someone else's query) is never interrupted
+        with self._lock:
+            if self.state is None:
+                self.state = reason
+            if self._dbapi is None:
+                return
+            server, thread = self._server, self._mysql_thread
+            if thread is None:
+                try:
+                    if hasattr(self._dbapi, "interrupt"):
+                        self._dbapi.interrupt()
+                    elif hasattr(self._dbapi, "cancel"):
+                        self._dbapi.cancel()
+                except Exception:
+                    log.exception("could not interrupt %s", self.name)
+                return
+        # KILL QUERY needs a second connection to the same server, from the same pool. It is checked out without
+        # the lock, so a pool wait never stalls run(); the kill itself is issued under the lock, and only if the
+        # statement is still running on that thread
+        try:
+            with server.connect() as conn, self._lock:
+                if self._dbapi is not None and self._mysql_thread == thread:
+                    conn.exec_driver_sql(f"KILL QUERY {int(thread)}")
+        except Exception:
+            log.exception("could not interrupt %s", self.name)
+
+
+class PanelBatch:
+    """The futures of one page's panel queries; leaving the `with` block cancels whatever is still running."""
+
+    def __init__(self, futures, queries):
+        self.futures = futures
+        self._queries = queries
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cancel()
+
+    def cancel(self):
+        for name, future in self.futures.items():
+            if not future.done():
+                future.cancel()
+                if name in self._queries:
+                    self._queries[name].cancel()
+
+    def as_completed(self, poll=0.25, on_wait=None):
+        """Yield (name, result, error) in completion order; on_wait(pending names) is called every `poll` s."""
+        pending = {future: name for name, future in self.futures.items()}
+        while pending:
+            done, _ = wait(pending, timeout=poll, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    yield name, future.result(), None
+                except Exception as exc:
+                    yield name, None, exc
+            if pending and on_wait is not None:
+                on_wait(sorted(pending.values()))
+
+
+class PanelLoader:
+    """Process-wide worker pool for panel queries, with a shared result cache per (panel, key, version).
+
+    Keep max_workers at or below the engine's pool_size so workers do not queue for connections that other
+    callers (the table cache, the forms) also need.
+    """
+
+    def __init__(self, engine, max_workers=4, timeout=30.0, ttl=60, version_ttl=900, metrics=None, cache=None):
+        self.engine = engine
+        self.timeout = timeout
+        self.ttl = ttl
+        self.version_ttl = version_ttl
+        self.metrics = metrics
+        self.cache = cache if cache is not None else ResultCache()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="panel")
+
+    def _store(self, cache_key, ttl, generation, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        # Refused if the panel was invalidated (e.g. after a write) while its query ran
+        self.cache.put(cache_key, future.result(), ttl=ttl, group=cache_key[0], generation=generation)
+
+    def submit(self, name, fn, *args, timeout=None, engine=None):
+        """Run fn(conn, *args) on a worker (on `engine`, by default the loader's); returns (future, query).
+
+        The query can be cancelled.
+        """
+        query = _Query(engine or self.engine, name, fn, args, self.timeout if timeout is None else timeout)
+        return submit_in_context(self.executor, self._run, query, time.perf_counter()), query
+
+    def _run(self, query, submitted):
+        if self.metrics is None:
+            return query.run()
+        # Queries issued by the panel are tagged with its name; wait is the time spent queued for a worker
+        with tagged(panel=query.name), self.metrics.timer(
+            "panel_data", query.name, cached=False, wait_ms=round((time.perf_counter() - submitted) * 1000, 3)
+        ) as extra:
+            result = query.run()
+            extra["rows"] = result_rows(result)
+            return result
+
+    def batch(self, panels, key=None, versions=None, engine=None):
+        """Start every panel in {name: (fn, args)} at once; cached results resolve immediately.
+
+        A result is reused for the same panel and `key` (e.g. Filters.key()) and, when `versions` gives one for
+        the panel, the same data version. A versioned result is replaced as soon as its data changes and is
+        otherwise kept up to version_ttl seconds (None: until evicted), since some panels also depend on the
+        clock; panels without a version are cached for ttl seconds. Queries run on `engine` if given (e.g. a
+        session's DbRouter.reader()).
+        """
+        futures, queries = {}, {}
+        versions = versions or {}
+        for name, (fn, args) in panels.items():
+            version = versions.get(name)
+            ttl = self.ttl if version is None else self.version_ttl
+            cacheable = key is not None and (ttl or version is not None)
+            cache_key = (name, key, version)
+            hit = self.cache.get(cache_key) if cacheable else MISS
+            if hit is not MISS:
+                futures[name] = Future()
+                futures[name].set_result(hit)
+                if self.metrics is not None:
+                    self.metrics.record("panel_data", name, 0.0, cached=True, rows=result_rows(hit))
+                continue
+            generation = self.cache.generation(name) if cacheable else None
+            futures[name], queries[name] = self.submit(name, fn, *args, engine=engine)
+            if cacheable:
+                futures[name].add_done_callback(
+                    lambda fut, k=cache_key, ttl=ttl, gen=generation: self._store(k, ttl, gen, fut)
+                )
+        return PanelBatch(futures, queries)
+
+    def invalidate(self, names=None):
+        """Drop cached results of the named panels (all panels by default), under every key and version.
+
+        Queries of those panels still running keep their results out of the cache.
+        """
+        names = None if names is None else set(names)
+        self.cache.invalidate(None if names is None else lambda k: k[0] in names, groups=names)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
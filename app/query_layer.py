@@ -0,0 +1,278 @@
+# app/query_layer.py
+# Server-side query layer for the dashboard panels.
+# Sidebar filters are turned into parameterized WHERE clauses so that MySQL does the
+# filtering and aggregation and only small result sets travel back to pandas.
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+
+@dataclass(frozen=True)
+class Filters:
+    owner: str = "All"
+    source: str = "All"
+    date_min: date = None
+    date_max: date = None
+
+    def params(self):
+        # Same window as the old pandas filter: from date_min 00:00 up to and including date_max + 1 day 00:00
+        p = {}
+        if self.date_min is not None:
+            p["date_from"] = datetime.combine(self.date_min, time.min)
+        if self.date_max is not None:
+            p["date_to"] = datetime.combine(self.date_max, time.min) + timedelta(days=1)
+        if self.owner != "All":
+            p["owner_name"] = self.owner
+        if self.source != "All":
+            p["source_name"] = self.source
+        return p
+
+    def key(self):
+        """Normalized, hashable identity of the filter set, for result cache keys."""
+        return (self.owner or "All", self.source or "All", _day(self.date_min), _day(self.date_max))
+
+
+def _day(value):
+    # date_input gives dates, other callers may pass datetimes or strings; all mean the same calendar day
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return pd.Timestamp(value).date()
+
+
+def where_clause(f, alias, owner_col=None, source_col=None, date_col="created_at"):
+    """Build a ' AND '-joined predicate for table `alias`; owner/source columns are optional per table."""
+    conds = []
+    if f.date_min is not None:
+        conds.append(f"{alias}.{date_col} >= :date_from")
+    if f.date_max is not None:
+        conds.append(f"{alias}.{date_col} <= :date_to")
+    # Filter on ids (indexed) rather than joined names
+    if owner_col and f.owner != "All":
+        conds.append(f"{alias}.{owner_col} IN (SELECT id FROM users WHERE name = :owner_name)")
+    if source_col and f.source != "All":
+        conds.append(f"{alias}.{source_col} IN (SELECT id FROM sources WHERE name = :source_name)")
+    return " AND ".join(conds) if conds else "1=1"
+
+
+# Per-table predicates. Leads honour owner/source/date, opportunities owner/date and activities date only,
+# matching which columns each panel frame carried before the push-down.
+def leads_where(f, alias="l"):
+    return where_clause(f, alias, owner_col="owner_id", source_col="source_id")
+
+
+def opps_where(f, alias="o"):
+    return where_clause(f, alias, owner_col="owner_id")
+
+
+def activities_where(f, alias="a"):
+    return where_clause(f, alias)
+
+
+def filter_frame(df, f, date_col="created_at"):
+    """In-memory equivalent of the predicates above, for frames that are already loaded."""
+    # If df is empty or doesn't have the date column, return it as-is
+    if df is None or df.empty or date_col not in df.columns:
+        return df.copy() if isinstance(df, pd.DataFrame) else pd.DataFrame()
+    res = df.copy()
+    res[date_col] = pd.to_datetime(res[date_col])
+    mask = (res[date_col] >= pd.to_datetime(f.date_min)) & (
+        res[date_col] <= pd.to_datetime(f.date_max) + pd.Timedelta(days=1)
+    )
+    res = res.loc[mask]
+    if f.owner != "All" and "owner_name" in res.columns:
+        res = res[res["owner_name"] == f.owner]
+    if f.source != "All" and "source_name" in res.columns:
+        res = res[res["source_name"] == f.source]
+    return res
+
+
+def load_dimensions(conn):
+    sources = pd.read_sql(text("SELECT * FROM sources"), conn)
+    users = pd.read_sql(text("SELECT * FROM users"), conn)
+    stages = pd.read_sql(text("SELECT * FROM stages ORDER BY stage_order"), conn)
+    return sources, users, stages
+
+
+def kpis(conn, f):
+    params = f.params()
+    lead_count = conn.execute(
+        text(f"SELECT COUNT(*) FROM leads l WHERE {leads_where(f)}"), params
+    ).scalar() or 0
+    row = conn.execute(
+        text(
+            "SELECT COUNT(*) AS opps, "
+            "SUM(CASE WHEN o.status = 'WON' THEN 1 ELSE 0 END) AS won, "
+            "SUM(CASE WHEN COALESCE(o.status, '') <> 'LOST' THEN o.value ELSE 0 END) AS pipeline "
+            f"FROM opportunities o WHERE {opps_where(f)}"
+        ),
+        params,
+    ).mappings().one()
+    opps = int(row["opps"] or 0)
+    return {
+        "leads": int(lead_count),
+        "opps": opps,
+        "won": int(row["won"] or 0),
+        "pipeline_value": float(row["pipeline"] or 0.0),
+        "conversion_pct": (opps / lead_count * 100) if lead_count else 0.0,
+    }
+
+
+def daily_leads(conn, f):
+    # New leads per calendar day (days without leads are absent); chart_data.pre_bin rolls them up
+    return pd.read_sql(
+        text(
+            "SELECT DATE(l.created_at) AS day, COUNT(*) AS n "
+            f"FROM leads l WHERE {leads_where(f)} "
+            "GROUP BY DATE(l.created_at)"
+        ),
+        conn,
+        params=f.params(),
+    )
+
+
+def weekly_leads(conn, f):
+    # Count per day in SQL, then roll the (at most a few thousand) daily rows up to W-MON weeks
+    return daily_to_weekly(daily_leads(conn, f))
+
+
+def daily_to_weekly(daily):
+    # `daily` has columns day, n
+    if daily.empty:
+        return pd.DataFrame(columns=["created_at", "count"])
+    daily["day"] = pd.to_datetime(daily["day"])
+    ts = daily.set_index("day")["n"].resample("W-MON").sum()
+    return ts.rename_axis("created_at").reset_index(name="count")
+
+
+def pipeline_by_stage(conn, f):
+    return pd.read_sql(
+        text(
+            "SELECT s.name AS stage_name, SUM(o.value) AS value "
+            "FROM opportunities o "
+            "JOIN stages s ON o.stage_id = s.id "
+            f"WHERE {opps_where(f)} "
+            "GROUP BY s.name "
+            "ORDER BY value DESC"
+        ),
+        conn,
+        params=f.params(),
+    )
+
+
+def top_sources(conn, f, limit=10):
+    # Opportunities (owner/date filtered) joined to their lead (owner/source/date filtered)
+    return pd.read_sql(
+        text(
+            "SELECT s.name AS source_name, COUNT(*) AS opps "
+            "FROM opportunities o "
+            "JOIN leads l ON o.lead_id = l.id "
+            "JOIN sources s ON l.source_id = s.id "
+            f"WHERE {opps_where(f)} AND {leads_where(f)} "
+            "GROUP BY s.name "
+            "ORDER BY opps DESC "
+            "LIMIT :limit"
+        ),
+        conn,
+        params={**f.params(), "limit": int(limit)},
+    )
+
+
+ACTIVITY_COLUMNS = (
+    "a.id, a.lead_id, a.opportunity_id, a.user_id, a.activity_type, a.subject, a.due_date, a.created_at"
+)
+
+
+def feed_where(f, alias="a"):
+    # The activity feed also honours the owner filter, as the activity's user
+    return where_clause(f, alias, owner_col="user_id")
+
+
+@dataclass(frozen=True)
+class ActivityPage:
+    rows: pd.DataFrame
+    next_cursor: str = None  # older activities, or None on the last page
+    prev_cursor: str = None  # newer activities, or None on the first page
+
+
+def encode_cursor(created_at, activity_id):
+    return f"{pd.Timestamp(created_at).isoformat()}~{int(activity_id)}"
+
+
+def decode_cursor(cursor):
+    created_at, activity_id = cursor.rsplit("~", 1)
+    return pd.Timestamp(created_at).to_pydatetime(), int(activity_id)
+
+
+def activity_page(conn, f, after=None, before=None, limit=25, with_notes=False):
+    """One page of the activity feed, newest first, keyset-paginated on (created_at, id).
+
+    `after` is a page's next_cursor (older rows), `before` its prev_cursor (newer rows). Each page is a
+    single index range read of limit + 1 rows, so its cost does not grow with the page number or the table.
+    """
+    conds, params = [feed_where(f)], {**f.params(), "limit": int(limit) + 1}
+    # Expanded form of (created_at, id) < / > (:c_at, :c_id) so the created_at index drives the range
+    if after:
+        params["c_at"], params["c_id"] = decode_cursor(after)
+        conds.append("a.created_at <= :c_at AND (a.created_at < :c_at OR a.id < :c_id)")
+        order = "DESC"
+    elif before:
+        params["c_at"], params["c_id"] = decode_cursor(before)
+        conds.append("a.created_at >= :c_at AND (a.created_at > :c_at OR a.id > :c_id)")
+        order = "ASC"
+    else:
+        order = "DESC"
+    df = pd.read_sql(
+        text(
+            f"SELECT {ACTIVITY_COLUMNS}, u.name AS user_name FROM activities a "
+            "LEFT JOIN users u ON a.user_id = u.id "
+            f"WHERE {' AND '.join(conds)} "
+            f"ORDER BY a.created_at {order}, a.id {order} "
+            "LIMIT :limit"
+        ),
+        conn,
+        params=params,
+    )
+    more = len(df) > limit
+    df = df.iloc[:limit]
+    if order == "ASC":
+        df = df.iloc[::-1]
+    df = df.reset_index(drop=True)
+    if "created_at" in df.columns and not df.empty:
+        df["created_at"] = pd.to_datetime(df["created_at"])
+    if with_notes:
+        notes = activity_notes(conn, df["id"])
+        df = df.assign(notes=df["id"].map(notes))
+    if df.empty:
+        return ActivityPage(df)
+    first, last = df.iloc[0], df.iloc[-1]
+    # Paging forward there are always newer rows (we came from them), backward always older ones
+    has_older = more if order == "DESC" else True
+    has_newer = bool(after) if order == "DESC" else more
+    return ActivityPage(
+        df,
+        next_cursor=encode_cursor(last["created_at"], last["id"]) if has_older else None,
+        prev_cursor=encode_cursor(first["created_at"], first["id"]) if has_newer else None,
+    )
+
+
+def recent_activities(conn, f, limit=25):
+    # First page of the feed; notes (TEXT) is left out, fetch it for the visible rows with activity_notes()
+    return activity_page(conn, f, limit=limit).rows
+
+
+def activity_notes(conn, ids):
+    """Return {activity id: notes} for the given ids."""
+    ids = [int(i) for i in ids]
+    if not ids:
+        return {}
+    rows = conn.execute(
+        text("SELECT id, notes FROM activities WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+        {"ids": ids},
+    )
+    return {int(r.id): r.notes for r in rows}
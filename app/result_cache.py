@@ -0,0 +1,123 @@
+# app/result_cache.py
+# Process-wide LRU cache for computed panel results, bounded by an approximate memory budget.
+# Entries are keyed by whatever identifies a result (panel name, normalized filters, data version); a key
+# that carries a data version stays valid until the version moves on, so an entry needs no expiry and old
+# versions simply age out of the LRU. Entries without one can be given a TTL instead.
+# Invalidation also moves a generation counter (per group, e.g. per panel), so a value computed before an
+# invalidate() and stored after it is refused rather than outliving the invalidation for its TTL.
+import dataclasses
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from frame_dtypes import frame_memory
+
+MISS = object()
+
+
+def approx_bytes(value):
+    """Deep size of a panel result: frames, arrays, dataclasses and the containers holding them."""
+    if isinstance(value, pd.DataFrame):
+        return frame_memory(value)
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return sys.getsizeof(value) + sum(approx_bytes(getattr(value, f.name)) for f in dataclasses.fields(value))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approx_bytes(k) + approx_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(approx_bytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """Thread-safe LRU of results under `max_bytes`; shared by every session of the process."""
+
+    def __init__(self, max_bytes=64 * 2**20):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, bytes, expires at or None)
+        self._epoch = 0  # moved by invalidations that may touch every group
+        self._generations = {}  # group -> invalidations of that group
+        self._lock = threading.Lock()
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def get(self, key):
+        """The cached value (now most recently used), or MISS."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return MISS
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def generation(self, group=None):
+        """Token to pass back to put() for a value about to be computed for `group`."""
+        with self._lock:
+            return self._epoch, self._generations.get(group, 0)
+
+    def put(self, key, value, ttl=None, group=None, generation=None):
+        """Store `value`, evicting least recently used entries past the budget; returns False if it is not stored.
+
+        With `generation` (from generation(group) before computing the value) the value is dropped if `group`
+        has been invalidated since.
+        """
+        size = approx_bytes(value)
+        if size > self.max_bytes:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(group, 0)):
+                return False
+            if key in self._entries:
+                self._drop(key)
+            for k in [k for k, (_, _, expires) in self._entries.items() if expires is not None and expires <= now]:
+                self._drop(k)
+            self._entries[key] = (value, size, now + ttl if ttl else None)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def invalidate(self, match=None, groups=None):
+        """Drop every entry, or those whose key satisfies `match(key)`, and move the generation of `groups`.
+
+        Without `groups` every group's generation moves.
+        """
+        with self._lock:
+            for key in [k for k in self._entries if match is None or match(k)]:
+                self._drop(key)
+            if groups is None:
+                self._epoch += 1
+            else:
+                for group in groups:
+                    self._generations[group] = self._generations.get(group, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "mb": round(self.bytes / 2**20, 2),
+                "budget_mb": round(self.max_bytes / 2**20, 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
@@ -0,0 +1,243 @@
+# app/rollups.py
+# Daily rollups (db/03_rollups.sql) and the incremental job that maintains them.
+# Each run finds the days touched since the previous run (via updated_at) and rebuilds only those
+# days with DELETE + INSERT ... SELECT inside one transaction. The readers at the bottom have the signatures and
+# results of the live functions in query_layer.py, so the dashboard can switch to them wholesale. top_sources
+# is the exception that stays live: it filters on the lead's created_at and owner as well as the opportunity's,
+# which a per-day rollup cannot hold without a row per lead day x opportunity day.
+#
+# Only the days rows are on now are rebuilt: a row whose created_at is edited (or a deleted row) leaves its old
+# day counted until the next --full run, since nothing records the day it moved from. Schedule --full nightly
+# if such edits happen.
+#
+#   python app/rollups.py           # incremental
+#   python app/rollups.py --full    # rebuild everything (picks up deletes)
+import argparse
+import os
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from local_db import apply_sql_file
+import query_layer
+from query_layer import daily_to_weekly
+
+# Stored for a table that is still empty, so the next run stays incremental and picks up its first rows
+EMPTY_WATERMARK = datetime(1970, 1, 1)
+
+ROLLUP_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "db", "03_rollups.sql")
+
+LEADS_INSERT = (
+    "INSERT INTO rollup_leads_daily (day, owner_id, source_id, status, leads) "
+    "SELECT DATE(l.created_at), COALESCE(l.owner_id, 0), COALESCE(l.source_id, 0), COALESCE(l.status, ''), COUNT(*) "
+    "FROM leads l WHERE {where} "
+    "GROUP BY DATE(l.created_at), COALESCE(l.owner_id, 0), COALESCE(l.source_id, 0), COALESCE(l.status, '')"
+)
+
+OPPS_INSERT = (
+    "INSERT INTO rollup_opps_daily (day, owner_id, source_id, stage_id, status, opps, value) "
+    "SELECT DATE(o.created_at), COALESCE(o.owner_id, 0), COALESCE(l.source_id, 0), COALESCE(o.stage_id, 0), "
+    "COALESCE(o.status, ''), COUNT(*), COALESCE(SUM(o.value), 0) "
+    "FROM opportunities o LEFT JOIN leads l ON o.lead_id = l.id WHERE {where} "
+    "GROUP BY DATE(o.created_at), COALESCE(o.owner_id, 0), COALESCE(l.source_id, 0), COALESCE(o.stage_id, 0), "
+    "COALESCE(o.status, '')"
+)
+
+
+# Days touched since the previous run. An opportunity's row also moves when its lead's source changes.
+LEAD_DAYS_CHANGED = "SELECT DISTINCT DATE(l.created_at) FROM leads l WHERE l.updated_at >= :wm"
+OPP_DAYS_CHANGED = (
+    "SELECT DISTINCT DATE(o.created_at) FROM opportunities o WHERE o.updated_at >= :owm "
+    "UNION SELECT DISTINCT DATE(o.created_at) FROM opportunities o "
+    "JOIN leads l ON o.lead_id = l.id WHERE l.updated_at >= :lwm"
+)
+
+
+def ensure_schema(engine):
+    apply_sql_file(engine, ROLLUP_SCHEMA)
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return pd.to_datetime(value).date()
+
+
+def day_runs(days):
+    """Collapse a set of days into sorted, contiguous (first, last) runs."""
+    runs = []
+    for d in sorted(set(days)):
+        if runs and d == runs[-1][1] + timedelta(days=1):
+            runs[-1] = (runs[-1][0], d)
+        else:
+            runs.append((d, d))
+    return runs
+
+
+def _rebuild_runs(conn, table, insert_sql, alias, runs):
+    for first, last in runs:
+        conn.execute(
+            text(f"DELETE FROM {table} WHERE day >= :first AND day <= :last"), {"first": first, "last": last}
+        )
+        conn.execute(
+            text(insert_sql.format(where=f"{alias}.created_at >= :start AND {alias}.created_at < :end")),
+            {
+                "start": datetime.combine(first, datetime.min.time()),
+                "end": datetime.combine(last + timedelta(days=1), datetime.min.time()),
+            },
+        )
+
+
+def _get_watermark(conn, name):
+    value = conn.execute(text("SELECT watermark FROM rollup_state WHERE name = :n"), {"n": name}).scalar()
+    return None if value is None else pd.to_datetime(value).to_pydatetime()
+
+
+def _set_watermark(conn, name, watermark):
+    conn.execute(text("DELETE FROM rollup_state WHERE name = :n"), {"n": name})
+    conn.execute(
+        text("INSERT INTO rollup_state (name, watermark, refreshed_at) VALUES (:n, :wm, :now)"),
+        {"n": name, "wm": watermark, "now": datetime.now().replace(microsecond=0)},
+    )
+
+
+def _days(conn, sql, params):
+    return [_as_date(d) for (d,) in conn.execute(text(sql), params) if d is not None]
+
+
+def refresh_rollups(engine, full=False):
+    """Bring the rollup tables up to date; returns a small stats dict."""
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        # Read the new watermarks first so rows written while we work are picked up next run
+        leads_wm = conn.execute(text("SELECT MAX(updated_at) FROM leads")).scalar()
+        opps_wm = conn.execute(text("SELECT MAX(updated_at) FROM opportunities")).scalar()
+        prev_leads = None if full else _get_watermark(conn, "leads")
+        prev_opps = None if full else _get_watermark(conn, "opportunities")
+
+        if prev_leads is None or prev_opps is None:
+            conn.execute(text("DELETE FROM rollup_leads_daily"))
+            conn.execute(text("DELETE FROM rollup_opps_daily"))
+            conn.execute(text(LEADS_INSERT.format(where="l.created_at IS NOT NULL")))
+            conn.execute(text(OPPS_INSERT.format(where="o.created_at IS NOT NULL")))
+            lead_runs = opp_runs = None
+        else:
+            lead_days = _days(conn, LEAD_DAYS_CHANGED, {"wm": prev_leads})
+            opp_days = _days(conn, OPP_DAYS_CHANGED, {"owm": prev_opps, "lwm": prev_leads})
+            lead_runs, opp_runs = day_runs(lead_days), day_runs(opp_days)
+            _rebuild_runs(conn, "rollup_leads_daily", LEADS_INSERT, "l", lead_runs)
+            _rebuild_runs(conn, "rollup_opps_daily", OPPS_INSERT, "o", opp_runs)
+
+        for name, wm in (("leads", leads_wm), ("opportunities", opps_wm)):
+            _set_watermark(conn, name, EMPTY_WATERMARK if wm is None else pd.to_datetime(wm).to_pydatetime())
+
+    return {
+        "mode": "full" if lead_runs is None else "incremental",
+        "lead_days": None if lead_runs is None else sum((b - a).days + 1 for a, b in lead_runs),
+        "opp_days": None if opp_runs is None else sum((b - a).days + 1 for a, b in opp_runs),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+# ---- readers: same signatures and result shapes as query_layer ----
+
+def rollup_params(f):
+    p = {k: v for k, v in f.params().items() if k not in ("date_from", "date_to")}
+    if f.date_min is not None:
+        p["day_from"] = f.date_min
+    if f.date_max is not None:
+        p["day_to"] = f.date_max
+    return p
+
+
+def rollup_where(f, alias, source=True):
+    conds = []
+    if f.date_min is not None:
+        conds.append(f"{alias}.day >= :day_from")
+    if f.date_max is not None:
+        conds.append(f"{alias}.day <= :day_to")
+    if f.owner != "All":
+        conds.append(f"{alias}.owner_id IN (SELECT id FROM users WHERE name = :owner_name)")
+    if source and f.source != "All":
+        conds.append(f"{alias}.source_id IN (SELECT id FROM sources WHERE name = :source_name)")
+    return " AND ".join(conds) if conds else "1=1"
+
+
+def kpis(conn, f):
+    params = rollup_params(f)
+    lead_count = conn.execute(
+        text(f"SELECT SUM(r.leads) FROM rollup_leads_daily r WHERE {rollup_where(f, 'r')}"), params
+    ).scalar() or 0
+    # Opportunities honour owner/date only, as in the live query
+    row = conn.execute(
+        text(
+            "SELECT SUM(r.opps) AS opps, "
+            "SUM(CASE WHEN r.status = 'WON' THEN r.opps ELSE 0 END) AS won, "
+            "SUM(CASE WHEN r.status <> 'LOST' THEN r.value ELSE 0 END) AS pipeline "
+            f"FROM rollup_opps_daily r WHERE {rollup_where(f, 'r', source=False)}"
+        ),
+        params,
+    ).mappings().one()
+    opps = int(row["opps"] or 0)
+    return {
+        "leads": int(lead_count),
+        "opps": opps,
+        "won": int(row["won"] or 0),
+        "pipeline_value": float(row["pipeline"] or 0.0),
+        "conversion_pct": (opps / lead_count * 100) if lead_count else 0.0,
+    }
+
+
+def daily_leads(conn, f):
+    return pd.read_sql(
+        text(f"SELECT r.day, SUM(r.leads) AS n FROM rollup_leads_daily r WHERE {rollup_where(f, 'r')} GROUP BY r.day"),
+        conn,
+        params=rollup_params(f),
+    )
+
+
+def weekly_leads(conn, f):
+    return daily_to_weekly(daily_leads(conn, f))
+
+
+def pipeline_by_stage(conn, f):
+    return pd.read_sql(
+        text(
+            "SELECT s.name AS stage_name, SUM(r.value) AS value "
+            "FROM rollup_opps_daily r "
+            "JOIN stages s ON r.stage_id = s.id "
+            f"WHERE {rollup_where(f, 'r', source=False)} "
+            "GROUP BY s.name "
+            "ORDER BY value DESC"
+        ),
+        conn,
+        params=rollup_params(f),
+    )
+
+
+def top_sources(conn, f, limit=10):
+    # The live join (see the header): rollup_opps_daily only knows the opportunity's day and owner
+    return query_layer.top_sources(conn, f, limit)
+
+
+def main():
+    from db_config import database_url, load_env
+
+    parser = argparse.ArgumentParser(description="Refresh the daily rollup tables")
+    parser.add_argument("--full", action="store_true",
+                        help="rebuild all days (also picks up deletes and edited created_at)")
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL / MYSQL_* from .env")
+    args = parser.parse_args()
+
+    load_env()
+    engine = create_engine(args.database_url or database_url(), pool_pre_ping=True)
+    ensure_schema(engine)
+    print(refresh_rollups(engine, full=args.full))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# app/snapshot_store.py
+# Local columnar snapshots of the cached frames, so a restarted app (or a new process) starts from disk
+# instead of re-running the join queries against MySQL. Frames are stored as uncompressed Arrow IPC
+# (Feather v2) files, which read back without a decompression step; a small JSON sidecar keeps the cache
+# metadata. The cache works on pandas frames, so a load converts the whole table into pandas memory; the file
+# is read normally rather than memory-mapped, since the mapping would not outlive the conversion.
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+log = logging.getLogger(__name__)
+
+
+class SnapshotStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, name):
+        base = os.path.join(self.directory, name)
+        return base + ".arrow", base + ".json"
+
+    def save(self, name, df, meta):
+        """Atomically replace the snapshot for `name`; failures are logged, never raised."""
+        data_path, meta_path = self._paths(name)
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            with self._lock:
+                # Data first, then the sidecar: a reader never sees metadata for a file that is not there yet
+                self._replace(name, data_path, lambda p: feather.write_feather(table, p, compression="uncompressed"))
+                meta = {**meta, "rows": len(df), "saved_at": time.time()}
+                self._replace(name, meta_path, lambda p: _write_json(p, meta))
+        except Exception:
+            log.exception("could not write snapshot %s", name)
+
+    def _replace(self, name, path, write):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=f".{name}.")
+        os.close(fd)
+        try:
+            write(tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def load(self, name):
+        """Return (frame, meta) for `name`, or None if there is no readable snapshot."""
+        data_path, meta_path = self._paths(name)
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            return None
+        try:
+            with open(meta_path, encoding="utf-8") as fh:
+                meta = json.load(fh)
+            df = feather.read_table(data_path).to_pandas()
+        except Exception:
+            log.exception("ignoring unreadable snapshot %s", name)
+            return None
+        return df, meta
+
+
+def _write_json(path, payload):
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(payload, fh)
@@ -0,0 +1,157 @@
+# app/stage_analytics.py
+# Stage-history analytics: time in stage, stage-to-stage transitions, cohort funnels and days to close.
+# opportunity_stage_history is read once per filter (joined to the opportunity's owner/status/dates and
+# its lead's source) and every metric is computed with NumPy/pandas array operations: rows are ordered
+# once with lexsort, "next stage" comes from a shifted array and counts from bincount, so there are no
+# per-opportunity Python loops and the cost stays linear in the number of history rows.
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from frame_dtypes import compact_frame
+from query_layer import opps_where
+
+OUTCOMES = ["WON", "LOST", "OPEN"]
+
+
+def load_stage_history(conn, f):
+    """History rows for opportunities matching owner/date (opportunity) and source (originating lead)."""
+    where = opps_where(f)
+    if f.source != "All":
+        where += " AND l.source_id IN (SELECT id FROM sources WHERE name = :source_name)"
+    df = pd.read_sql(
+        text(
+            "SELECT h.id, h.opportunity_id, h.stage_id, h.entered_at, h.left_at, "
+            "o.status, o.created_at AS opp_created_at, o.closed_at "
+            "FROM opportunity_stage_history h "
+            "JOIN opportunities o ON h.opportunity_id = o.id "
+            "LEFT JOIN leads l ON o.lead_id = l.id "
+            f"WHERE {where}"
+        ),
+        conn,
+        params=f.params(),
+    )
+    df = compact_frame(df)
+    if not df.empty:
+        df["opp_created_at"] = pd.to_datetime(df["opp_created_at"])
+    return df
+
+
+def _stage_codes(hist, stages):
+    # Map stage ids to 0..K-1 in stage_order through a lookup array (ids are small integers)
+    ordered = stages.sort_values("stage_order")
+    ids = ordered["id"].to_numpy(dtype=np.int64)
+    hist_ids = hist["stage_id"].to_numpy(dtype=np.int64)
+    size = max([0] + [int(a.max()) for a in (ids, hist_ids) if len(a)]) + 1
+    lookup = np.full(size, -1, dtype=np.int64)
+    lookup[ids] = np.arange(len(ids))
+    return lookup[hist_ids], ordered["name"].tolist()
+
+
+def _ordered(hist):
+    """Positions that sort history by (opportunity, entered_at, id), and the 'last row of its opportunity' mask."""
+    opp = hist["opportunity_id"].to_numpy(dtype=np.int64)
+    entered = hist["entered_at"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    order = np.lexsort((hist["id"].to_numpy(dtype=np.int64), entered, opp))
+    opp_sorted = opp[order]
+    is_last = np.append(opp_sorted[1:] != opp_sorted[:-1], True)
+    return order, is_last
+
+
+def time_in_stage(hist, stages, now=None):
+    """Days spent per stage visit (open visits run until `now`), summarised per stage."""
+    columns = ["stage", "visits", "open", "mean_days", "median_days", "p90_days"]
+    if hist.empty:
+        return pd.DataFrame(columns=columns)
+    now = np.datetime64(now or pd.Timestamp.now(), "ns")
+    entered = hist["entered_at"].to_numpy(dtype="datetime64[ns]")
+    left = hist["left_at"].to_numpy(dtype="datetime64[ns]")
+    is_open = np.isnat(left)
+    days = (np.where(is_open, now, left) - entered).astype(np.int64) / 86_400e9
+    codes, names = _stage_codes(hist, stages)
+    df = pd.DataFrame({"code": codes, "days": days, "open": is_open})
+    g = df[df["code"] >= 0].groupby("code")
+    out = pd.DataFrame({
+        "visits": g.size(),
+        "open": g["open"].sum(),
+        "mean_days": g["days"].mean(),
+        "median_days": g["days"].median(),
+        "p90_days": g["days"].quantile(0.9),
+    }).reindex(range(len(names)), fill_value=0)
+    out.insert(0, "stage", names)
+    return out.reset_index(drop=True).round(1)
+
+
+def transition_matrix(hist, stages, normalize=True):
+    """Stage -> next stage (or final outcome) counts; row-normalised to conversion rates when `normalize`."""
+    codes, names = _stage_codes(hist, stages)
+    k = len(names)
+    labels = names + [f"→ {o}" for o in OUTCOMES]
+    if hist.empty:
+        return pd.DataFrame(0.0, index=names, columns=labels)
+    order, is_last = _ordered(hist)
+    src = codes[order]
+    # Next state: the following row's stage, or the opportunity's outcome on its last row
+    status = hist["status"].astype(object).to_numpy()[order]
+    outcome = np.select([status == "WON", status == "LOST"], [k, k + 1], default=k + 2)
+    dst = np.where(is_last, outcome, np.append(src[1:], 0))
+    # Rows in, or moving to, a stage missing from `stages` have no cell; with dst = -1 the flat index would
+    # land in the previous row's last column
+    valid = (src >= 0) & (dst >= 0)
+    counts = np.bincount(src[valid] * len(labels) + dst[valid], minlength=k * len(labels)).reshape(k, len(labels))
+    matrix = pd.DataFrame(counts, index=names, columns=labels)
+    if normalize:
+        totals = matrix.sum(axis=1).replace(0, np.nan)
+        matrix = (matrix.div(totals, axis=0) * 100).fillna(0).round(1)
+    return matrix
+
+
+def cohort_funnel(hist, stages, freq="M", as_pct=False):
+    """Per creation cohort: opportunities that ever reached each stage, and how many were won."""
+    codes, names = _stage_codes(hist, stages)
+    if hist.empty:
+        return pd.DataFrame(columns=["cohort", "opportunities"] + names + ["WON"])
+    k = len(names)
+    opp = hist["opportunity_id"].to_numpy(dtype=np.int64)
+    valid = codes >= 0
+    # Distinct (opportunity, stage) visits, encoded into one int64 and deduped after a sort
+    # (a plain sort beats np.unique's hash path on tens of millions of keys)
+    pairs = np.sort(opp[valid] * k + codes[valid])
+    pairs = pairs[np.append(True, pairs[1:] != pairs[:-1])]
+    visit_opp, visit_stage = pairs // k, pairs % k
+
+    # Cohorts as integer codes (boxing millions of Period objects is the slow path), looked up per visit
+    per_opp = hist.drop_duplicates("opportunity_id").sort_values("opportunity_id")
+    opp_ids = per_opp["opportunity_id"].to_numpy(dtype=np.int64)
+    cohort_codes, cohorts = pd.factorize(per_opp["opp_created_at"].dt.to_period(freq), sort=True)
+    n = len(cohorts)
+    visit_cohort = cohort_codes[np.searchsorted(opp_ids, visit_opp)]
+    known = visit_cohort >= 0  # factorize codes a NULL created_at as -1
+    reached = np.bincount(visit_cohort[known] * k + visit_stage[known], minlength=n * k).reshape(n, k)
+    won = (per_opp["status"] == "WON").to_numpy() & (cohort_codes >= 0)
+
+    out = pd.DataFrame(reached, index=cohorts, columns=names)
+    out.insert(0, "opportunities", np.bincount(cohort_codes[cohort_codes >= 0], minlength=n))
+    out["WON"] = np.bincount(cohort_codes[won], minlength=n)
+    if as_pct:
+        out[names + ["WON"]] = (out[names + ["WON"]].div(out["opportunities"], axis=0) * 100).round(1)
+    out.index = out.index.astype(str)
+    return out.rename_axis("cohort").reset_index()
+
+
+def days_to_close(hist, bins=20):
+    """Days from creation to close for WON/LOST opportunities: (summary per status, histogram)."""
+    per_opp = hist.drop_duplicates("opportunity_id")
+    closed = per_opp[per_opp["status"].isin(["WON", "LOST"]) & per_opp["closed_at"].notna()]
+    if closed.empty:
+        return pd.DataFrame(columns=["status", "count", "mean_days", "median_days", "p90_days"]), pd.DataFrame()
+    days = (closed["closed_at"] - closed["opp_created_at"]).dt.total_seconds().to_numpy() / 86400
+    status = closed["status"].astype(object).to_numpy()
+    summary = pd.DataFrame({"status": status, "days": days}).groupby("status")["days"].agg(
+        count="size", mean_days="mean", median_days="median", p90_days=lambda d: d.quantile(0.9)
+    ).round(1).reset_index()
+    edges = np.histogram_bin_edges(days, bins=bins)
+    hist_df = pd.DataFrame({"bin_start": edges[:-1].round(1), "bin_end": edges[1:].round(1)})
+    for s in ("WON", "LOST"):
+        hist_df[s.lower()] = np.histogram(days[status == s], bins=edges)[0]
+    return summary, hist_df
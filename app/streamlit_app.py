@@ -1,83 +1,124 @@
 # app/streamlit_app.py
 import os
-import urllib.parse
+import time
+import uuid
 from datetime import datetime, timedelta
 import pandas as pd
 import streamlit as st
-from sqlalchemy import create_engine, text
-from dotenv import load_dotenv
+from sqlalchemy import create_engine
 import plotly.express as px
 
-# Load .env (try parent folder first, then current)
-if os.path.exists('../.env'):
-    load_dotenv('../.env')
-else:
-    load_dotenv()
+from db_config import database_url, load_env, pool_options, replica_connect_args, replica_urls
+from chart_data import RESOLUTIONS, line_figure, pick_resolution, pre_bin
+from db_router import DbRouter
+from export import FORMATS, cli_command, spooled_export
+import instrumentation
+from instrumentation import Metrics, instrument_engine, submit_in_context, summarize
+from lead_search import LeadSearchIndex
+from panel_loader import PanelLoader, PanelTimeout
+import query_layer
+import rollups
+from query_layer import Filters, activity_notes, activity_page
+from result_cache import ResultCache
+from stage_analytics import cohort_funnel, days_to_close, load_stage_history, time_in_stage, transition_matrix
+from table_cache import TableCache
+from write_service import convert_leads, import_leads
+
+load_env()
+DATABASE_URL = database_url()
+
+# Read KPI/series/stage panels from the daily rollups (db/03_rollups.sql) once the job is scheduled (top sources
+# stays live, see rollups.py)
+USE_ROLLUPS = os.getenv("CRM_USE_ROLLUPS", "0") == "1"
+panel_queries = rollups if USE_ROLLUPS else query_layer
+
+
+# Timings of queries, panels and the table cache (debug sidebar, and CRM_METRICS_FILE as JSON lines)
+@st.cache_resource
+def get_metrics():
+    return Metrics(path=os.getenv("CRM_METRICS_FILE"))
 
-# Build DB connection safely (handles special characters in password)
-user = os.getenv("MYSQL_USER")
-_password_raw = os.getenv("MYSQL_PASSWORD") or ""
-password = urllib.parse.quote_plus(_password_raw)
-host = os.getenv("MYSQL_HOST", "127.0.0.1")
-port = os.getenv("MYSQL_PORT", "3306")
-db = os.getenv("MYSQL_DB", "crm_db")
 
-# If user provided a full DATABASE_URL in .env, prefer it; otherwise build one
-DATABASE_URL = os.getenv("DATABASE_URL") or f"mysql+pymysql://{user}:{password}@{host}:{port}/{db}"
+# One engine (and pool) per process, so the cached loaders and the forms share it and it is instrumented once
+@st.cache_resource
+def get_engine():
+    return instrument_engine(create_engine(DATABASE_URL, pool_pre_ping=True, **pool_options()), get_metrics(),
+                             label="primary")
+
+
+# Analytics reads go to the read replicas in DATABASE_REPLICA_URLS (if any), load-balanced and health-checked;
+# writes and a session's reads right after its own writes use the primary engine
+@st.cache_resource
+def get_router():
+    replicas = [
+        instrument_engine(
+            create_engine(url, pool_pre_ping=True, connect_args=replica_connect_args(url), **pool_options()),
+            get_metrics(), label=f"replica{i}",
+        )
+        for i, url in enumerate(replica_urls(), 1)
+    ]
+    return DbRouter(get_engine(), replicas, check_interval=float(os.getenv("CRM_REPLICA_CHECK_INTERVAL", "10")),
+                    max_lag=float(os.getenv("CRM_REPLICA_MAX_LAG", "30")))
+
 
 # Create engine
 try:
-    engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+    engine = get_engine()
+    router = get_router()
 except Exception as e:
     st.error("Failed to create DB engine. Check your DATABASE_URL / .env. Error: " + str(e))
     st.stop()
 
 st.set_page_config(layout="wide", page_title="CRM Analytics Dashboard")
 
-# Load tables (cached)
-@st.cache_data(ttl=60)
-def load_tables():
-    with engine.connect() as conn:
-        leads = pd.read_sql(
-            text(
-                "SELECT l.*, s.name as source_name, u.name as owner_name "
-                "FROM leads l "
-                "LEFT JOIN sources s ON l.source_id = s.id "
-                "LEFT JOIN users u ON l.owner_id = u.id"
-            ),
-            conn,
-        )
-        opps = pd.read_sql(
-            text(
-                "SELECT o.*, s.name as stage_name, u.name as owner_name "
-                "FROM opportunities o "
-                "LEFT JOIN stages s ON o.stage_id = s.id "
-                "LEFT JOIN users u ON o.owner_id = u.id"
-            ),
-            conn,
-        )
-        activities = pd.read_sql(
-            text(
-                "SELECT a.*, u.name as user_name FROM activities a "
-                "LEFT JOIN users u ON a.user_id = u.id"
-            ),
-            conn,
-        )
-        sources = pd.read_sql(text("SELECT * FROM sources"), conn)
-        users = pd.read_sql(text("SELECT * FROM users"), conn)
-        stages = pd.read_sql(text("SELECT * FROM stages ORDER BY stage_order"), conn)
+# Every event recorded during this script run (queries, panels, cache lookups) carries its run id
+run_id = uuid.uuid4().hex[:8]
+instrumentation.tag(run=run_id)
+page_started = time.perf_counter()
+
+# This session's reads: the replicas, or the primary for a while after it wrote (read-your-writes)
+reads = router.reader(st.session_state)
+
+
+# Row-level and dimension frames live in a process-wide incremental cache shared by all sessions.
+# With CRM_SNAPSHOT_DIR set, the cache starts from local Arrow snapshots and refreshes in the background.
+@st.cache_resource
+def get_table_cache():
+    snapshot_dir = os.getenv("CRM_SNAPSHOT_DIR")
+    if snapshot_dir:
+        from snapshot_store import SnapshotStore
+
+        return TableCache(router, refresh_interval=60, reconcile_interval=900,
+                          snapshots=SnapshotStore(snapshot_dir), background=True, metrics=get_metrics(), primary=engine)
+    return TableCache(router, refresh_interval=60, reconcile_interval=900, metrics=get_metrics(), primary=engine)
 
-    # ensure datetime types if present
-    for df, col in [(leads, "created_at"), (opps, "created_at"), (activities, "created_at")]:
-        if col in df.columns and not df.empty:
-            df[col] = pd.to_datetime(df[col])
 
-    return leads, opps, activities, sources, users, stages
+# Panel queries run on this shared worker pool; keep CRM_PANEL_WORKERS at or below CRM_DB_POOL_SIZE.
+# Their results are kept in one LRU shared by all sessions, bounded by CRM_RESULT_CACHE_MB.
+@st.cache_resource
+def get_panel_loader():
+    cache = ResultCache(max_bytes=int(float(os.getenv("CRM_RESULT_CACHE_MB", "64")) * 2**20))
+    return PanelLoader(router, max_workers=int(os.getenv("CRM_PANEL_WORKERS", "4")),
+                       timeout=float(os.getenv("CRM_QUERY_TIMEOUT", "30")), ttl=60, metrics=get_metrics(), cache=cache)
+
+
+# Typeahead index over lead name/email/phone, shared by all sessions and synced with the cached leads frame
+@st.cache_resource
+def get_lead_index():
+    return LeadSearchIndex()
+
+
+def load_tables():
+    table_cache = get_table_cache()
+    # On a cold cache the five frames load concurrently; warm calls return almost at once
+    names = ("leads", "opps", "sources", "users", "stages")
+    executor = get_panel_loader().executor
+    return tuple(f.result() for f in [submit_in_context(executor, table_cache.get, name) for name in names])
 
 
 # Try to load tables, show friendly error if DB is unreachable or query fails
 try:
-    leads, opps, activities, sources, users, stages = load_tables()
+    leads, opps, sources, users, stages = load_tables()
 except Exception as e:
     st.error("Error loading data from the database. Check DB, tables and .env. Error: " + str(e))
     st.stop()
@@ -92,89 +133,243 @@ date_max = st.sidebar.date_input("To", value=datetime.now().date())
 source_opts = ["All"] + (sources["name"].tolist() if not sources.empty else [])
 source_filter = st.sidebar.selectbox("Source", source_opts)
 
-def filter_df(df, date_col="created_at"):
-    # If df is empty or doesn't have the date column, return it as-is
-    if df is None or df.empty or date_col not in df.columns:
-        return df.copy() if isinstance(df, pd.DataFrame) else pd.DataFrame()
-    res = df.copy()
-    res[date_col] = pd.to_datetime(res[date_col])
-    mask = (res[date_col] >= pd.to_datetime(date_min)) & (
-        res[date_col] <= pd.to_datetime(date_max) + pd.Timedelta(days=1)
+with st.sidebar.expander("Cache memory"):
+    st.dataframe(get_table_cache().memory_report(), hide_index=True)
+    result_stats = get_panel_loader().cache.stats()
+    st.caption(
+        f"Panel results: {result_stats['entries']} entries, {result_stats['mb']} of {result_stats['budget_mb']} MB, "
+        f"hit rate {result_stats['hit_rate'] if result_stats['hit_rate'] is not None else '–'}, "
+        f"{result_stats['evictions']} evicted"
     )
-    res = res.loc[mask]
-    if owner_filter != "All" and "owner_name" in res.columns:
-        res = res[res["owner_name"] == owner_filter]
-    if source_filter != "All" and "source_name" in res.columns:
-        res = res[res["source_name"] == source_filter]
-    return res
-
-f_leads = filter_df(leads)
-f_opps = filter_df(opps)
-f_activities = filter_df(activities)
-
-# KPI tiles
-col1, col2, col3, col4, col5 = st.columns(5)
-col1.metric("New leads", int(f_leads.shape[0]) if not f_leads.empty else 0)
-col2.metric("Opportunities", int(f_opps.shape[0]) if not f_opps.empty else 0)
-won = f_opps[f_opps["status"] == "WON"].shape[0] if "status" in f_opps.columns else 0
-col3.metric("Won", int(won))
-pipeline_value = float(f_opps[f_opps["status"] != "LOST"]["value"].sum()) if "value" in f_opps.columns else 0.0
-col4.metric("Pipeline value", f"${pipeline_value:,.0f}")
-conv_rate = (f_opps.shape[0] / f_leads.shape[0] * 100) if (not f_leads.empty and f_leads.shape[0] > 0) else 0
-col5.metric("Conversion % (opps/leads)", f"{conv_rate:.1f}%")
-
-# Time series — New leads (weekly)
-st.markdown("### Time series — New leads (weekly)")
-if not f_leads.empty:
-    ts = f_leads.set_index("created_at").resample("W-MON").size().reset_index(name="count")
-    fig = px.line(ts, x="created_at", y="count", title="New leads per week")
-    st.plotly_chart(fig, use_container_width=True)
-else:
-    st.info("No leads in this period.")
-
-# Funnel-style: lead -> opportunity -> won
-st.markdown("### Funnel / conversion")
-total_leads = f_leads.shape[0] if not f_leads.empty else 0
-total_opps = f_opps.shape[0] if not f_opps.empty else 0
-total_won = f_opps[f_opps["status"] == "WON"].shape[0] if "status" in f_opps.columns else 0
-funnel_df = pd.DataFrame({"stage": ["Leads", "Opportunities", "Won"], "count": [total_leads, total_opps, total_won]})
-fig2 = px.bar(funnel_df, x="stage", y="count", title="Simple funnel")
-st.plotly_chart(fig2, use_container_width=True)
-
-# Pipeline by stage
-st.markdown("### Pipeline value by stage")
-if "stage_name" in f_opps.columns and "value" in f_opps.columns and not f_opps.empty:
-    pipeline = f_opps.groupby("stage_name")["value"].sum().reset_index().sort_values("value", ascending=False)
+
+filters = Filters(owner=owner_filter, source=source_filter, date_min=date_min, date_max=date_max)
+
+
+# Panel aggregates are computed in SQL, concurrently (one pooled connection per query); results are cached
+# per (panel, filters, data version) in the loader's shared LRU
+
+
+def stage_velocity(conn, f, stage_frame):
+    hist = load_stage_history(conn, f)
+    summary, close_hist = days_to_close(hist)
+    return {
+        "time_in_stage": time_in_stage(hist, stage_frame),
+        "transitions": transition_matrix(hist, stage_frame),
+        "cohorts": cohort_funnel(hist, stage_frame, as_pct=True),
+        "close_summary": summary,
+        "close_hist": close_hist,
+    }
+
+
+def lead_series(conn, f):
+    # Daily counts from SQL, binned to day / week / month on the worker; rendering just picks one
+    return pre_bin(panel_queries.daily_leads(conn, f))
+
+
+PANELS = {
+    "kpis": (panel_queries.kpis, (filters,)),
+    "lead_series": (lead_series, (filters,)),
+    "pipeline": (panel_queries.pipeline_by_stage, (filters,)),
+    "top_sources": (panel_queries.top_sources, (filters,)),
+    "velocity": (stage_velocity, (filters, stages)),
+    "recent_activities": (activity_page, (filters,)),
+}
+# Tables each panel reads, so a write only drops the panel results it can change
+PANEL_TABLES = {
+    "kpis": {"leads", "opps"},
+    "lead_series": {"leads"},
+    "pipeline": {"opps"},
+    "top_sources": {"leads", "opps"},
+    "velocity": {"opps", "opportunity_stage_history", "stages"},
+    "recent_activities": {"activities"},
+}
+# Data version of each panel's inputs: the table cache versions of what it reads, plus the dimensions its filters
+# resolve names against. The cached tables are refreshed at the top of every run, so an unchanged version means
+# an unchanged result. Panels reading tables the cache does not hold (activities, stage history), and the
+# rollups, which change when the rollup job runs, get no version and fall back to the loader's ttl.
+CACHED_TABLES = {"leads", "opps", "users", "sources"}
+PANEL_VERSIONS = {} if USE_ROLLUPS else {
+    name: tuple((t, get_table_cache().version(t)) for t in sorted(read | {"users", "sources"}))
+    for name, read in PANEL_TABLES.items() if read <= CACHED_TABLES
+}
+
+
+def after_write(tables, message, rejected=None):
+    """Invalidate what a write touched, then rerun so every panel shows it; the message survives the rerun."""
+    for table in tables:
+        get_table_cache().invalidate(table)
+    get_panel_loader().invalidate([name for name, read in PANEL_TABLES.items() if read & set(tables)])
+    router.wrote(st.session_state)
+    st.session_state["write_notice"] = (message, rejected)
+    st.rerun()
+
+
+def render_kpis(box, r):
+    k = r["kpis"]
+    col1, col2, col3, col4, col5 = box.columns(5)
+    col1.metric("New leads", k["leads"])
+    col2.metric("Opportunities", k["opps"])
+    col3.metric("Won", k["won"])
+    col4.metric("Pipeline value", f"${k['pipeline_value']:,.0f}")
+    col5.metric("Conversion % (opps/leads)", f"{k['conversion_pct']:.1f}%")
+
+
+def render_lead_series(box, r):
+    bins = r["lead_series"]
+    if bins["day"].sum() == 0:
+        box.info("No leads in this period.")
+        return
+    choice = box.radio("Granularity", ["Auto"] + [name.title() for name in RESOLUTIONS], horizontal=True,
+                       key="series_resolution")
+    if choice == "Auto":
+        days = bins["day"].index
+        resolution = pick_resolution(filters.date_min or days[0], filters.date_max or days[-1])
+    else:
+        resolution = choice.lower()
+    series = bins[resolution]
+    box.plotly_chart(line_figure(series, f"New leads per {resolution}", y_title="leads"), use_container_width=True)
+
+
+def render_funnel(box, r):
+    k = r["kpis"]
+    funnel_df = pd.DataFrame({"stage": ["Leads", "Opportunities", "Won"], "count": [k["leads"], k["opps"], k["won"]]})
+    fig2 = px.bar(funnel_df, x="stage", y="count", title="Simple funnel")
+    box.plotly_chart(fig2, use_container_width=True)
+
+
+def render_pipeline(box, r):
+    pipeline = r["pipeline"]
     if pipeline.shape[0]:
         fig3 = px.bar(pipeline, x="stage_name", y="value", title="Pipeline value by stage")
-        st.plotly_chart(fig3, use_container_width=True)
+        box.plotly_chart(fig3, use_container_width=True)
     else:
-        st.info("No opportunities to show pipeline")
-else:
-    st.info("No opportunities to show pipeline")
-
-# Top sources by conversion
-st.markdown("### Top sources by conversion")
-if "source_id" in leads.columns and "id" in sources.columns and not f_opps.empty and not f_leads.empty:
-    # leads_with_opps: join opps' lead_id to filtered leads' id and their source_name
-    if "lead_id" in f_opps.columns and "id" in f_leads.columns and "source_name" in f_leads.columns:
-        leads_with_opps = f_opps[["lead_id"]].merge(f_leads[["id", "source_name"]], left_on="lead_id", right_on="id", how="inner")
-        if leads_with_opps.shape[0]:
-            src = leads_with_opps.groupby("source_name").size().reset_index(name="opps").sort_values("opps", ascending=False)
-            st.table(src.head(10))
+        box.info("No opportunities to show pipeline")
+
+
+def render_top_sources(box, r):
+    k = r["kpis"]
+    if k["leads"] and k["opps"]:
+        src = r["top_sources"]
+        if src.shape[0]:
+            box.table(src)
         else:
-            st.info("No conversions (opportunities linked to leads) in this period")
+            box.info("No conversions (opportunities linked to leads) in this period")
     else:
-        st.info("No conversions (opportunities linked to leads) in this period")
-else:
-    st.info("No source data or no conversions to compute.")
+        box.info("No source data or no conversions to compute.")
+
+
+def render_velocity(box, r):
+    velocity = r["velocity"]
+    if velocity["time_in_stage"].empty:
+        box.info("No stage history for opportunities in this period.")
+        return
+    vcol1, vcol2 = box.columns(2)
+    fig4 = px.bar(velocity["time_in_stage"], x="stage", y="mean_days",
+                  hover_data=["median_days", "p90_days", "visits"], title="Average days in stage")
+    vcol1.plotly_chart(fig4, use_container_width=True)
+    if not velocity["close_hist"].empty:
+        fig5 = px.bar(velocity["close_hist"], x="bin_start", y=["won", "lost"], title="Days to close",
+                      labels={"bin_start": "days", "value": "opportunities"})
+        vcol2.plotly_chart(fig5, use_container_width=True)
+        vcol2.dataframe(velocity["close_summary"], hide_index=True)
+    else:
+        vcol2.info("No closed opportunities in this period.")
+    box.markdown("Stage → next stage / outcome (% of visits)")
+    box.dataframe(velocity["transitions"])
+    box.markdown("Monthly cohort funnel (% of the cohort's opportunities reaching each stage)")
+    box.dataframe(velocity["cohorts"], hide_index=True)
 
-# Recent activities table
-st.markdown("### Recent activities")
-if not f_activities.empty:
-    st.dataframe(f_activities.sort_values("created_at", ascending=False).head(25))
-else:
-    st.info("No activities in this period.")
+
+def set_feed_cursor(**cursor):
+    # Button callback: the cursor belongs to the filters it was taken under
+    st.session_state["feed_cursor"] = (filters, cursor)
+
+
+def render_recent(box, r):
+    page = r["recent_activities"]
+    # Pages past the first are keyset reads of one page each; the first page comes from the panel batch
+    feed_filters, cursor = st.session_state.get("feed_cursor", (None, None))
+    if cursor and feed_filters == filters:
+        with reads.connect() as conn:
+            page = activity_page(conn, filters, **cursor)
+    recent = page.rows
+    if not recent.empty:
+        if box.checkbox("Show notes", key="recent_notes"):
+            with reads.connect() as conn:
+                notes = activity_notes(conn, recent["id"])
+            recent = recent.assign(notes=recent["id"].map(notes))
+        box.dataframe(recent)
+        ncol1, ncol2, _ = box.columns([1, 1, 6])
+        ncol1.button("← Newer", key="feed_newer", disabled=page.prev_cursor is None,
+                     on_click=set_feed_cursor, kwargs={"before": page.prev_cursor})
+        ncol2.button("Older →", key="feed_older", disabled=page.next_cursor is None,
+                     on_click=set_feed_cursor, kwargs={"after": page.next_cursor})
+    else:
+        box.info("No activities in this period.")
+
+
+notice = st.session_state.pop("write_notice", None)
+if notice:
+    message, rejected = notice
+    st.success(message)
+    if rejected is not None and not rejected.empty:
+        with st.expander(f"{len(rejected):,} rejected rows"):
+            st.dataframe(rejected, hide_index=True)
+
+# Page layout first: one placeholder per panel, filled in whatever order the queries finish
+status = st.empty()
+layout = []
+for heading, needs, render in (
+    (None, ("kpis",), render_kpis),
+    ("Time series — New leads", ("lead_series",), render_lead_series),
+    ("Funnel / conversion", ("kpis",), render_funnel),
+    ("Pipeline value by stage", ("pipeline",), render_pipeline),
+    ("Top sources by conversion", ("kpis", "top_sources"), render_top_sources),
+    ("Stage velocity", ("velocity",), render_velocity),
+    ("Recent activities", ("recent_activities",), render_recent),
+):
+    if heading:
+        st.markdown(f"### {heading}")
+    slot = st.empty()
+    slot.caption("Loading…")
+    layout.append((slot, needs, render))
+
+results, errors = {}, {}
+# Replica results are cached apart from primary results and only for the loader's ttl. The table cache versions
+# describe whatever server its last refresh read from, and each replica trails by its own lag, so no version says
+# whether a replica's result is current; keying on one could keep a result that misses rows for version_ttl.
+# Deployments with replicas thus recompute panels every ttl seconds instead of only when their data changes.
+on_primary = reads is engine
+with get_panel_loader().batch(
+    PANELS, key=(filters.key(), "primary" if on_primary else "replica"),
+    versions=PANEL_VERSIONS if on_primary else None, engine=reads,
+) as batch:
+    # Updating the status line each poll also lets a Streamlit rerun interrupt the wait; leaving the
+    # block then cancels the queries that are still running
+    for name, result, error in batch.as_completed(
+        on_wait=lambda pending: status.caption("Loading " + ", ".join(pending) + "…")
+    ):
+        if error is None:
+            results[name] = result
+        else:
+            errors[name] = error
+        for entry in [e for e in layout if name in e[1]]:
+            slot, needs, render = entry
+            failed = [n for n in needs if n in errors]
+            if failed:
+                err = errors[failed[0]]
+                if isinstance(err, PanelTimeout):
+                    slot.warning(f"{err}. Narrow the filters or try again.")
+                else:
+                    slot.error(f"Error computing this panel. Error: {err}")
+            elif all(n in results for n in needs):
+                with get_metrics().timer("panel_render", render.__name__.removeprefix("render_")):
+                    render(slot.container(), results)
+            else:
+                continue
+            layout.remove(entry)
+status.empty()
+get_metrics().record("page", "panels", time.perf_counter() - page_started)
 
 # CRUD: add new lead
 st.sidebar.markdown("---")
@@ -192,68 +387,121 @@ else:
         score = st.slider("Lead score", 0, 100, 50)
         submitted = st.form_submit_button("Create lead")
         if submitted:
-            owner_id = int(users[users["name"] == owner]["id"].iloc[0])
-            source_id = int(sources[sources["name"] == source]["id"].iloc[0])
-            with engine.begin() as conn:
-                conn.execute(
-                    text(
-                        """INSERT INTO leads (name,email,phone,owner_id,source_id,lead_score,created_at,updated_at)
-                           VALUES (:n,:e,:p,:o,:s,:score,NOW(),NOW())"""
-                    ),
-                    {"n": name, "e": email, "p": phone, "o": owner_id, "s": source_id, "score": score},
-                )
-            st.sidebar.success("Lead created. Refresh page to see.")
+            row = pd.DataFrame([{"name": name, "email": email, "phone": phone or None, "owner": owner,
+                                 "source": source, "lead_score": score}])
+            # As before the import path, name and email may be left blank here
+            result = import_leads(engine, row, users, sources, require_contact=False)
+            if result.ids:
+                after_write(["leads"], f"Lead {result.ids[0]} created.")
+            st.sidebar.error(f"Lead not created: {result.rejected['error'].iloc[0]}.")
+
+    with st.sidebar.expander("Import leads (CSV)"):
+        st.caption("Columns: name, email, phone, owner, source, lead_score, status. "
+                   "Rows whose email already exists are skipped.")
+        upload = st.file_uploader("Lead file", type="csv", key="lead_import")
+        if upload is not None and st.button("Import", key="lead_import_go"):
+            raw = pd.read_csv(upload, dtype=str, keep_default_na=False, na_values=[""])
+            result = import_leads(engine, raw, users, sources)
+            message = (f"Imported {len(result.ids):,} of {len(raw):,} leads "
+                       f"({result.rows_per_sec:,.0f} rows/s), {len(result.rejected):,} rejected.")
+            if result.ids:
+                after_write(["leads"], message, result.rejected)
+            st.error(message)
+            st.dataframe(result.rejected, hide_index=True)
 
 # Convert lead to opportunity
 st.markdown("### Convert a lead to opportunity")
-if f_leads.empty or stages.empty or users.empty:
+if leads.empty or stages.empty or users.empty:
     st.info("Conversion disabled: ensure leads, stages and users exist.")
 else:
+    lead_index = get_lead_index()
+    lead_index.sync(leads, get_table_cache().version("leads"))
+    # As before the search index, the picker offers the leads inside the sidebar filters
+    lead_query = st.text_input("Find lead (within the sidebar filters)", placeholder="Name, email or phone",
+                               key="lead_query")
+    matches = lead_index.search(lead_query, k=20, filters=filters)
+    lead_labels = {
+        int(r.id): " · ".join(str(v) for v in (r.name, r.email, r.phone) if pd.notna(v))
+        for r in matches.itertuples(index=False)
+    }
     with st.form("convert"):
-        lead_choice = st.selectbox(
-            "Lead",
-            f_leads[["id", "name"]]
-            .astype(str)
-            .apply(lambda r: f"{r['id']} — {r['name']}", axis=1)
-            .tolist(),
-        )
-        lead_id = int(lead_choice.split(" — ")[0])
+        # Options are lead ids; the label is display only
+        lead_id = st.selectbox("Lead", list(lead_labels), format_func=lambda i: f"{i} — {lead_labels[i]}")
         value = st.number_input("Opportunity value", min_value=0.0, step=100.0, value=5000.0)
         owner_sel = st.selectbox("Owner for opportunity", users["name"].tolist())
         stage_sel = st.selectbox("Initial stage", stages["name"].tolist())
         do_convert = st.form_submit_button("Convert lead")
-        if do_convert:
-            owner_id = int(users[users["name"] == owner_sel]["id"].iloc[0])
-            stage_id = int(stages[stages["name"] == stage_sel]["id"].iloc[0])
-            with engine.begin() as conn:
-                # mark lead converted
-                conn.execute(text("UPDATE leads SET status='CONVERTED', converted_at=NOW() WHERE id=:lid"), {"lid": lead_id})
-                # create opportunity
-                conn.execute(
-                    text(
-                        """INSERT INTO opportunities (lead_id, owner_id, stage_id, value, created_at, updated_at, stage_entered_at)
-                           VALUES (:lid, :owner, :stage, :val, NOW(), NOW(), NOW())"""
-                    ),
-                    {"lid": lead_id, "owner": owner_id, "stage": stage_id, "val": value},
-                )
-                # reliably fetch last insert id in MySQL
-                opp_id = conn.execute(text("SELECT LAST_INSERT_ID()")).scalar()
-                conn.execute(
-                    text("INSERT INTO opportunity_stage_history (opportunity_id, stage_id, entered_at) VALUES (:opp,:stage,NOW())"),
-                    {"opp": opp_id, "stage": stage_id},
-                )
-            st.success(f"Lead {lead_id} converted into opportunity {opp_id}. Refresh to see changes.")
-
-# Export CSV of filtered leads or opportunities
+        if do_convert and lead_id is None:
+            st.warning("No lead matches the search.")
+        elif do_convert:
+            conversion = pd.DataFrame([{"lead_id": lead_id, "value": value, "owner": owner_sel, "stage": stage_sel}])
+            result = convert_leads(engine, conversion, users, stages)
+            if result.ids:
+                after_write(["leads", "opps"], f"Lead {lead_id} converted into opportunity {result.ids[0]}.")
+            st.error(f"Lead {lead_id} not converted: {result.rejected['error'].iloc[0]}.")
+
+    with st.expander("Bulk convert (CSV)"):
+        st.caption("Columns: lead_id, and optionally value, owner and stage (default: the lead's owner, first stage).")
+        upload = st.file_uploader("Conversion file", type="csv", key="bulk_convert")
+        if upload is not None and st.button("Convert leads", key="bulk_convert_go"):
+            raw = pd.read_csv(upload, dtype=str, keep_default_na=False, na_values=[""])
+            result = convert_leads(engine, raw, users, stages)
+            message = (f"Converted {len(result.ids):,} of {len(raw):,} leads "
+                       f"({result.rows_per_sec:,.0f} rows/s), {len(result.rejected):,} rejected.")
+            if result.ids:
+                after_write(["leads", "opps"], message, result.rejected)
+            st.error(message)
+            st.dataframe(result.rejected, hide_index=True)
+
+# Export filtered leads or opportunities, streamed from the database in chunks
 st.markdown("### Export data")
 export_choice = st.selectbox("Export", ["Leads (filtered)", "Opportunities (filtered)"])
-if st.button("Download CSV"):
-    if export_choice.startswith("Leads"):
-        csv = f_leads.to_csv(index=False).encode("utf-8")
-        st.download_button("Download Leads CSV", csv, file_name="leads_filtered.csv", mime="text/csv")
+export_format = st.selectbox("Format", list(FORMATS), index=list(FORMATS).index("csv.gz"))
+# download_button keeps its payload in memory, so exports from the page stop at EXPORT_MAX_ROWS rows; larger
+# ones are handed to `python app/export.py`, which writes to disk with no limit
+EXPORT_MAX_ROWS = int(os.getenv("CRM_EXPORT_MAX_ROWS", "250000"))
+if st.button("Prepare export"):
+    kind = "leads" if export_choice.startswith("Leads") else "opps"
+    with st.spinner("Exporting..."):
+        export_file, export_rows, export_name, export_mime = spooled_export(
+            reads, kind, filters, export_format, limit=EXPORT_MAX_ROWS + 1
+        )
+    with export_file:
+        payload = export_file.read() if export_rows <= EXPORT_MAX_ROWS else None
+    if payload is None:
+        st.warning(f"More than {EXPORT_MAX_ROWS:,} rows match: too many to download from the page. "
+                   "Export them from the command line instead:")
+        st.code(cli_command(kind, filters, export_format), language="sh")
     else:
-        csv = f_opps.to_csv(index=False).encode("utf-8")
-        st.download_button("Download Opps CSV", csv, file_name="opps_filtered.csv", mime="text/csv")
+        st.download_button(
+            f"Download {export_rows:,} rows ({export_name})", payload, file_name=export_name, mime=export_mime
+        )
 
 st.markdown("---")
 st.markdown("Built for an analytics-first BA workflow: SQL → pandas → dashboard. Use this to answer business questions like: How is pipeline trend vs. target? Which source gives highest win rate?")
+
+# Debug sidebar: where this run's time went, and process-wide percentiles
+if st.sidebar.checkbox("Debug timings", value=os.getenv("CRM_DEBUG") == "1"):
+    run_events = get_metrics().frame(run=run_id)
+    with st.sidebar.expander("This run", expanded=True):
+        if run_events.empty:
+            st.caption("No events recorded.")
+        else:
+            panels = run_events[run_events["kind"].isin(["panel_data", "panel_render"])]
+            if not panels.empty:
+                cols = [c for c in ("kind", "name", "ms", "cached", "wait_ms") if c in panels.columns]
+                st.dataframe(panels[cols], hide_index=True)
+            queries = run_events[run_events["kind"] == "query"]
+            if not queries.empty:
+                st.caption(f"{len(queries)} queries, {queries['ms'].sum():,.0f} ms in total")
+                cols = [c for c in ("ms", "panel", "db", "rows", "sql") if c in queries.columns]
+                st.dataframe(queries.sort_values("ms", ascending=False)[cols].head(15), hide_index=True)
+            lookups = run_events[run_events["kind"] == "table_cache"]
+            if not lookups.empty:
+                st.dataframe(lookups[["name", "outcome", "ms", "rows"]], hide_index=True)
+    if router.replicas:
+        with st.sidebar.expander("Database servers"):
+            st.caption("This session reads from the " + ("primary (recent write)" if on_primary else "replicas"))
+            st.dataframe(pd.DataFrame(router.status()), hide_index=True)
+    with st.sidebar.expander("Process (recent events)"):
+        st.dataframe(summarize(get_metrics().frame()), hide_index=True)
@@ -0,0 +1,291 @@
+# app/table_cache.py
+# Process-wide, watermark-based cache for the row-level CRM frames.
+# A refresh only pulls rows whose watermark column moved past the last value we saw and merges them
+# by id, so its cost follows the change rate. A periodic full reload catches deletes (which leave no
+# trace in updated_at) and renamed users/sources/stages in the joined name columns.
+import logging
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from frame_dtypes import align_categories, compact_frame, concat_compact, frame_memory
+
+log = logging.getLogger(__name__)
+
+# Rows per chunk of a full load
+FULL_LOAD_CHUNK = 50_000
+
+
+# name -> (base SELECT with joins, table alias, watermark column or None)
+# activities has no updated_at; rows are append-only so created_at serves as the watermark.
+TABLE_SPECS = {
+    # Explicit column lists: only what the app reads. activities.notes is TEXT and is fetched per page
+    # on demand (query_layer.activity_notes) instead of being held for every row.
+    "leads": (
+        "SELECT l.id, l.name, l.email, l.phone, l.owner_id, l.source_id, l.status, l.lead_score, "
+        "l.created_at, l.updated_at, l.converted_at, s.name as source_name, u.name as owner_name "
+        "FROM leads l "
+        "LEFT JOIN sources s ON l.source_id = s.id "
+        "LEFT JOIN users u ON l.owner_id = u.id",
+        "l",
+        "updated_at",
+    ),
+    "opps": (
+        "SELECT o.id, o.lead_id, o.customer_id, o.owner_id, o.stage_id, o.value, o.status, "
+        "o.created_at, o.updated_at, o.stage_entered_at, o.closed_at, s.name as stage_name, u.name as owner_name "
+        "FROM opportunities o "
+        "LEFT JOIN stages s ON o.stage_id = s.id "
+        "LEFT JOIN users u ON o.owner_id = u.id",
+        "o",
+        "updated_at",
+    ),
+    "activities": (
+        "SELECT a.id, a.lead_id, a.opportunity_id, a.user_id, a.activity_type, a.subject, a.due_date, "
+        "a.created_at, u.name as user_name FROM activities a "
+        "LEFT JOIN users u ON a.user_id = u.id",
+        "a",
+        "created_at",
+    ),
+    # Dimension tables are small; they have no watermark and are simply reloaded on each refresh
+    "sources": ("SELECT * FROM sources", "sources", None),
+    "users": ("SELECT * FROM users", "users", None),
+    "stages": ("SELECT * FROM stages ORDER BY stage_order", "stages", None),
+}
+
+
+def _fingerprint(frame):
+    # Order-independent hash of the rows' values (the query has no ORDER BY). Numbers and timestamps are hashed
+    # at one width, so a frame merged from separately compacted parts matches a fresh load of the same rows.
+    wide = {}
+    for col in frame.columns:
+        dtype = frame[col].dtype
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            wide[col] = "datetime64[ns]"
+        elif pd.api.types.is_numeric_dtype(dtype) and not isinstance(dtype, pd.CategoricalDtype):
+            wide[col] = "float64"
+    hashed = pd.util.hash_pandas_object(frame.astype(wide) if wide else frame, index=False)
+    return len(frame), int(hashed.to_numpy().sum())
+
+
+def _read(query, conn, params=None):
+    return compact_frame(pd.read_sql(text(query), conn, params=params))
+
+
+class IncrementalTable:
+    def __init__(self, name, query, alias, watermark_col):
+        self.name = name
+        self.query = query
+        self.alias = alias
+        self.watermark_col = watermark_col
+        self.frame = None
+        self.watermark = None
+        self.version = 0  # bumped only when the frame's contents change
+        self.fingerprint = None
+        self.last_full_load = 0.0
+        self.memory = {}
+        self.lock = threading.Lock()
+
+    def _update_watermark(self):
+        if self.frame is not None and self.watermark_col in self.frame.columns and not self.frame.empty:
+            wm = self.frame[self.watermark_col].max()
+            self.watermark = None if pd.isna(wm) else wm.to_pydatetime()
+
+    def full_load(self, conn):
+        # Read and compact in chunks, so peak memory is one raw chunk plus the compact frame rather than the
+        # whole table as read plus its compact copy
+        conn = conn.execution_options(stream_results=True, max_row_buffer=FULL_LOAD_CHUNK)
+        chunks, rows, raw_bytes = [], 0, 0
+        for raw in pd.read_sql(text(self.query), conn, chunksize=FULL_LOAD_CHUNK):
+            rows += len(raw)
+            raw_bytes += frame_memory(raw)
+            chunks.append(compact_frame(raw))
+            del raw
+        # An empty result may yield no chunk at all; the plain read then costs nothing
+        frame = concat_compact(chunks) if chunks else compact_frame(pd.read_sql(text(self.query), conn))
+        del chunks
+        self.memory = {"rows": rows, "raw_bytes": raw_bytes, "compact_bytes": frame_memory(frame)}
+        log.info("%s: %d rows, %.1f MB as read, %.1f MB compacted", self.name, self.memory["rows"],
+                 self.memory["raw_bytes"] / 2**20, self.memory["compact_bytes"] / 2**20)
+        # A reload that read back the same rows (the usual reconcile, or a dimension refresh) keeps the version,
+        # so nothing keyed on it (snapshots, the search index, cached panel results) is rebuilt for nothing
+        fingerprint = _fingerprint(frame)
+        if self.frame is not None and self.fingerprint is None:
+            self.fingerprint = _fingerprint(self.frame)
+        changed = self.frame is None or fingerprint != self.fingerprint
+        self.frame, self.fingerprint = frame, fingerprint
+        self._update_watermark()
+        self.last_full_load = time.time()
+        if changed:
+            self.version += 1
+        return len(self.frame)
+
+    def load_frame(self, frame, full_loaded_at):
+        # Adopt a frame restored from a snapshot; the next refresh picks up from its watermark
+        self.frame = frame
+        self.fingerprint = None  # unknown until the next full load
+        self.memory = {"rows": len(frame), "compact_bytes": frame_memory(frame)}
+        self._update_watermark()
+        self.last_full_load = full_loaded_at
+        self.version += 1
+
+    def refresh(self, conn):
+        """Fetch rows changed since the watermark and merge them by id; returns the number of rows that changed."""
+        if self.frame is None or self.watermark is None or self.watermark_col is None:
+            return self.full_load(conn)
+        # >= rather than > so rows written in the same second as the watermark are not missed; the rows at the
+        # watermark come back every time, so those we already hold with the same watermark value are dropped
+        delta = _read(f"{self.query} WHERE {self.alias}.{self.watermark_col} >= :wm", conn, {"wm": self.watermark})
+        pos = pd.Index(self.frame["id"]).get_indexer(delta["id"])
+        held = pos >= 0
+        same = np.zeros(len(delta), dtype=bool)
+        same[held] = (
+            self.frame[self.watermark_col].to_numpy()[pos[held]] == delta[self.watermark_col].to_numpy()[held]
+        )
+        delta = delta[~same]
+        if delta.empty:
+            return 0
+        kept = self.frame[~self.frame["id"].isin(delta["id"])]
+        kept, delta = align_categories(kept, delta)
+        self.frame = pd.concat([kept, delta], ignore_index=True)
+        self.fingerprint = None  # hashed again only when the next full load needs to compare
+        self._update_watermark()
+        self.version += 1
+        return len(delta)
+
+
+class TableCache:
+    """Keeps one IncrementalTable per name in memory, shared by every session of the process.
+
+    With a SnapshotStore, frames are seeded from the local snapshot on first use and the snapshot is
+    rewritten after every refresh that changed something. With background=True a due refresh runs on a
+    worker thread while callers keep getting the current frame (stale-while-revalidate).
+
+    `engine` may be a db_router.DbRouter, so scheduled refreshes and reloads read from a replica; the refresh
+    that follows invalidate() (our own write) reads from `primary` so the write is seen at once.
+    """
+
+    def __init__(self, engine, refresh_interval=60, reconcile_interval=900, snapshots=None, background=False,
+                 metrics=None, primary=None):
+        self.engine = engine
+        self.primary = primary if primary is not None else engine
+        self.metrics = metrics
+        self.refresh_interval = refresh_interval
+        self.reconcile_interval = reconcile_interval
+        self.snapshots = snapshots
+        self.background = background
+        self.tables = {}
+        self.last_refresh = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def _table(self, name):
+        with self._lock:
+            if name not in self.tables:
+                query, alias, watermark_col = TABLE_SPECS[name]
+                self.tables[name] = IncrementalTable(name, query, alias, watermark_col)
+            return self.tables[name]
+
+    def _load_snapshot(self, table):
+        snap = self.snapshots.load(table.name) if self.snapshots else None
+        if snap is None:
+            return False
+        df, meta = snap
+        if meta.get("query") != table.query:
+            return False
+        table.load_frame(df, meta.get("full_loaded_at", 0.0))
+        return True
+
+    def _run(self, table, full, engine=None):
+        # Callers hold table.lock
+        before = table.version
+        with (engine or self.engine).connect() as conn:
+            if full:
+                table.full_load(conn)
+            else:
+                table.refresh(conn)
+        with self._lock:
+            self.last_refresh[table.name] = time.time()
+            self._dirty.discard(table.name)
+        if self.snapshots and table.version != before:
+            meta = {"query": table.query, "full_loaded_at": table.last_full_load}
+            threading.Thread(target=self.snapshots.save, args=(table.name, table.frame, meta), daemon=True).start()
+
+    def _due(self, table):
+        now = time.time()
+        full = now - table.last_full_load >= self.reconcile_interval
+        return full, full or now - self.last_refresh.get(table.name, 0.0) >= self.refresh_interval
+
+    def _refresh_in_background(self, table):
+        if not table.lock.acquire(blocking=False):
+            return
+        try:
+            full, due = self._due(table)
+            if due:
+                self._run(table, full)
+        except Exception:
+            log.exception("background refresh of %s failed", table.name)
+        finally:
+            table.lock.release()
+
+    def get(self, name, force=False):
+        """Return the cached frame for `name`, refreshing it if it is due. Callers must not mutate it."""
+        started = time.perf_counter()
+        table = self._table(name)
+        # hit: served from memory; stale: served while a background refresh runs; refresh / full: fetched first
+        outcome = "hit"
+        if table.frame is None:
+            with table.lock:
+                if table.frame is None:
+                    if self._load_snapshot(table):
+                        outcome = "snapshot"
+                    else:
+                        self._run(table, full=True)
+                        outcome = "full"
+        full, due = self._due(table)
+        if force or name in self._dirty:
+            with table.lock:
+                self._run(table, full, self.primary)
+            outcome = "full" if full else "refresh"
+        elif due:
+            if self.background:
+                if not table.lock.locked():
+                    threading.Thread(target=self._refresh_in_background, args=(table,), daemon=True).start()
+                outcome = "stale"
+            else:
+                with table.lock:
+                    full, due = self._due(table)
+                    if due:
+                        self._run(table, full)
+                        outcome = "full" if full else "refresh"
+        if self.metrics is not None:
+            self.metrics.record("table_cache", name, time.perf_counter() - started, outcome=outcome,
+                                rows=len(table.frame), version=table.version)
+        return table.frame
+
+    def memory_report(self):
+        """Rows and deep memory per cached frame, before (as read) and after dtype compaction."""
+        rows = []
+        for name, table in sorted(self.tables.items()):
+            if table.frame is None:
+                continue
+            m = table.memory
+            rows.append({
+                "frame": name,
+                "rows": len(table.frame),
+                "raw_mb": round(m["raw_bytes"] / 2**20, 2) if "raw_bytes" in m else None,
+                "compact_mb": round(frame_memory(table.frame) / 2**20, 2),
+            })
+        return pd.DataFrame(rows)
+
+    def version(self, name):
+        return self._table(name).version
+
+    def invalidate(self, name=None):
+        # The next get() refreshes synchronously, even in background mode (used after our own writes)
+        with self._lock:
+            for key in [name] if name else list(self.tables):
+                self.last_refresh.pop(key, None)
+                self._dirty.add(key)
@@ -0,0 +1,346 @@
+# app/write_service.py
+# Batched CRM writes: lead import from CSV and lead -> opportunity conversion, for one row or thousands.
+# Each call is one transaction. Rows go in with executemany in batches (pymysql folds an INSERT ... VALUES
+# executemany into multi-row INSERT statements, so a batch is one round trip), and lookups are set-based
+# (one IN query per batch) rather than per row. New opportunity ids are read back with one grouped query
+# instead of a LAST_INSERT_ID() round trip per row. Every call returns {table: (rows, seconds)} for a
+# rows/sec report, like seed/bulk_seed.py.
+#
+#   python app/write_service.py import leads.csv                  # validate, dedupe on email, insert
+#   python app/write_service.py import leads.csv --dry-run        # validate only; rejects to stdout
+#   python app/write_service.py convert conversions.csv --stage Prospecting
+import argparse
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+
+import pandas as pd
+from sqlalchemy import bindparam, create_engine, text
+
+BATCH_SIZE = 1000
+
+# Import columns; name and email are required, the rest may be missing or blank
+IMPORT_COLUMNS = ["name", "email", "phone", "owner", "source", "lead_score", "status"]
+LEAD_STATUSES = ("NEW", "CONTACTED", "QUALIFIED", "CONVERTED", "DISCARDED")
+# CONVERTED is only set by convert_leads, together with converted_at and the lead's opportunity
+IMPORT_STATUSES = tuple(s for s in LEAD_STATUSES if s != "CONVERTED")
+_EMAIL = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+# Emails are stored lower-cased. MySQL compares them case-insensitively anyway (utf8mb4_unicode_ci);
+# the SQLite stand-in compares exactly, which matches for everything imported through here
+EXISTING_EMAILS = "SELECT email FROM leads WHERE email IN :emails"
+LEAD_IDS = "SELECT id, email FROM leads WHERE email IN :emails"
+CONVERTIBLE_LEADS = "SELECT id, owner_id FROM leads WHERE id IN :ids AND status <> 'CONVERTED'"
+# Timestamps are the database's clock, read once per call (so every row of a write carries the same one), as
+# the forms' NOW() always were. updated_at is set explicitly: the SQLite stand-in has no ON UPDATE
+# CURRENT_TIMESTAMP, and the table cache and the lead search index pick changes up by updated_at
+DB_NOW = {"sqlite": "SELECT datetime('now', 'localtime')"}
+MARK_CONVERTED = "UPDATE leads SET status = 'CONVERTED', converted_at = :now, updated_at = :now WHERE id IN :ids"
+# Newest opportunity per lead: inside the conversion transaction that is the one just inserted
+NEW_OPPORTUNITIES = "SELECT lead_id, MAX(id) AS id FROM opportunities WHERE lead_id IN :ids GROUP BY lead_id"
+
+
+@dataclass
+class WriteResult:
+    """Outcome of one batched write: ids written, rows rejected (with a reason) and per-table timings."""
+
+    ids: list = field(default_factory=list)
+    rejected: pd.DataFrame = field(default_factory=pd.DataFrame)
+    report: dict = field(default_factory=dict)
+
+    @property
+    def rows_per_sec(self):
+        rows, secs = self.report.get("total", (0, 0.0))
+        return rows / secs if secs else 0.0
+
+
+def _in(sql, name):
+    return text(sql).bindparams(bindparam(name, expanding=True))
+
+
+def _batches(values, size=BATCH_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _db_now(conn):
+    return pd.Timestamp(conn.exec_driver_sql(DB_NOW.get(conn.dialect.name, "SELECT NOW()")).scalar()).to_pydatetime()
+
+
+def _lookup(frame, values):
+    """Map user/source names (or user emails, or ids) in `values` to ids; returns (ids, unknown non-blank mask).
+
+    A name shared by several rows maps to the first of them.
+    """
+    key = values.astype("string").str.strip().str.lower()
+    ids = pd.Series(pd.NA, index=values.index, dtype="Int64")
+    for col in [c for c in ("name", "email") if c in frame.columns]:
+        labels = frame[col].astype(str).str.lower()
+        first = ~labels.duplicated()
+        mapping = dict(zip(labels[first], frame["id"].astype("int64")[first]))
+        ids = ids.fillna(key.map(mapping).astype("Int64"))
+    as_id = pd.to_numeric(key, errors="coerce")
+    known_ids = set(frame["id"].astype("int64"))
+    ids = ids.fillna(as_id.where(as_id.isin(known_ids)).astype("Int64"))
+    blank = key.isna() | (key == "")
+    return ids, ~blank & ids.isna()
+
+
+def _normalized(raw, columns):
+    df = raw.rename(columns=lambda c: str(c).strip().lower()).copy()
+    for col in columns:
+        if col not in df.columns:
+            df[col] = None
+    return df
+
+
+def _not_a_number(values):
+    # Non-blank entries that do not parse; returns (parsed, mask)
+    parsed = pd.to_numeric(values, errors="coerce")
+    blank = values.isna() | (values.astype(str).str.strip() == "")
+    return parsed, ~blank & parsed.isna()
+
+
+def _split(raw, df, checks):
+    """Rows of `df` passing every (mask, reason) check, and the matching `raw` rows with the first failed reason."""
+    error = pd.Series(pd.NA, index=df.index, dtype="string")
+    for mask, reason in checks:
+        error = error.mask(error.isna() & mask.fillna(False).astype(bool), reason)
+    rejected = raw.loc[error.notna()].assign(error=error[error.notna()])
+    return df.loc[error.isna()], rejected
+
+
+def validate_leads(raw, users, sources, require_contact=True):
+    """Clean an import frame; returns (rows ready to insert, rejected rows with an 'error' column).
+
+    Emails are trimmed and lower-cased; duplicate emails within the file keep their first row.
+    Owner accepts a user name, email or id, source a source name or id. With require_contact=False (the
+    add-lead form) name and email may be left blank and are stored as NULL; an email that is given is checked.
+    """
+    df = _normalized(raw, IMPORT_COLUMNS)
+    df["name"] = df["name"].astype("string").str.strip().replace("", pd.NA)
+    df["email"] = df["email"].astype("string").str.strip().str.lower().replace("", pd.NA)
+    df["phone"] = df["phone"].astype("string").str.strip()
+    df["owner_id"], bad_owner = _lookup(users, df["owner"])
+    df["source_id"], bad_source = _lookup(sources, df["source"])
+    score, bad_score = _not_a_number(df["lead_score"])
+    df["lead_score"] = score.fillna(0).clip(0, 100).astype("int64")
+    df["status"] = df["status"].astype("string").str.strip().str.upper().fillna("NEW").replace("", "NEW")
+    return _split(raw, df, [
+        (df["name"].isna() & require_contact, "missing name"),
+        (df["email"].isna() & require_contact, "invalid email"),
+        (df["email"].notna() & ~df["email"].fillna("").str.fullmatch(_EMAIL), "invalid email"),
+        (bad_owner, "unknown owner"),
+        (bad_source, "unknown source"),
+        (bad_score, "lead_score is not a number"),
+        (df["status"] == "CONVERTED", "status CONVERTED is set by converting the lead"),
+        (~df["status"].isin(IMPORT_STATUSES), "unknown status"),
+        (df["email"].notna() & df["email"].duplicated(), "duplicate email in file"),
+    ])
+
+
+def validate_conversions(raw, users, stages, default_stage=None, default_value=0.0):
+    """Clean a conversion frame (lead_id, optional value / owner / stage); returns (rows, rejected rows).
+
+    Owner accepts a user name, email or id and defaults to the lead's owner; stage a stage name or id,
+    defaulting to `default_stage` or else the first stage.
+    """
+    df = _normalized(raw, ["lead_id", "value", "owner", "stage"])
+    df["lead_id"], bad_lead = _not_a_number(df["lead_id"])
+    df["owner_id"], bad_owner = _lookup(users, df["owner"])
+    df["stage_id"], bad_stage = _lookup(stages, df["stage"])
+    if default_stage is None:
+        default_stage_id = int(stages.sort_values("stage_order")["id"].iloc[0])
+    else:
+        default_stage_id = _lookup(stages, pd.Series([default_stage]))[0].iloc[0]
+        if pd.isna(default_stage_id):
+            raise ValueError(f"unknown stage {default_stage!r}")
+    df["stage_id"] = df["stage_id"].fillna(default_stage_id)
+    df["value"], bad_value = _not_a_number(df["value"])
+    df["value"] = df["value"].fillna(default_value)
+    return _split(raw, df, [
+        (df["lead_id"].isna() | bad_lead, "missing lead_id"),
+        (df["lead_id"].duplicated(), "lead listed twice"),
+        (bad_owner, "unknown owner"),
+        (bad_stage, "unknown stage"),
+        (bad_value, "value is not a number"),
+    ])
+
+
+def _existing_emails(conn, emails):
+    found = set()
+    for batch in _batches(list(emails)):
+        found.update(e.lower() for (e,) in conn.execute(_in(EXISTING_EMAILS, "emails"), {"emails": batch}))
+    return found
+
+
+def _insert_sql(conn, table, columns):
+    placeholder = "?" if conn.dialect.paramstyle == "qmark" else "%s"
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join([placeholder] * len(columns))})"
+
+
+def _insert(conn, table, columns, rows):
+    sql = _insert_sql(conn, table, columns)
+    for batch in _batches(rows):
+        conn.exec_driver_sql(sql, batch)
+    return len(rows)
+
+
+def _insert_each(conn, table, columns, rows, ids):
+    # One statement per row, appending its new id to `ids`: for rows with no email to read the id back by
+    sql = _insert_sql(conn, table, columns)
+    ids.extend(conn.exec_driver_sql(sql, row).lastrowid for row in rows)
+    return len(rows)
+
+
+def _mark_converted(conn, lead_ids, now):
+    for batch in _batches(lead_ids):
+        conn.execute(_in(MARK_CONVERTED, "ids"), {"now": now, "ids": batch})
+    return len(lead_ids)
+
+
+def _timed(report, table, fn, *args):
+    # fn returns the number of rows it wrote
+    t0 = time.perf_counter()
+    rows = fn(*args)
+    rows_before, secs = report.get(table, (0, 0.0))
+    report[table] = (rows_before + rows, secs + time.perf_counter() - t0)
+
+
+def import_leads(engine, raw, users, sources, dry_run=False, require_contact=True):
+    """Validate `raw` (a frame of IMPORT_COLUMNS), drop emails that already exist, insert the rest in one transaction.
+
+    `users` and `sources` are the dimension frames used to resolve owner and source names; see validate_leads
+    for `require_contact`.
+    """
+    started = time.perf_counter()
+    valid, rejected = validate_leads(raw, users, sources, require_contact)
+    report, ids = {}, []
+    with engine.begin() as conn:
+        emails = valid["email"].dropna().tolist()
+        existing = _existing_emails(conn, emails) if emails else set()
+        dup = valid["email"].isin(existing).fillna(False).astype(bool)
+        if dup.any():
+            rejected = pd.concat([rejected, raw.loc[valid.index[dup]].assign(error="email already exists")])
+            valid = valid[~dup]
+        if len(valid) and not dry_run:
+            now = _db_now(conn)
+            rows = [
+                (None if pd.isna(r.name) else r.name, None if pd.isna(r.email) else r.email,
+                 None if pd.isna(r.phone) else r.phone,
+                 None if pd.isna(r.owner_id) else int(r.owner_id), None if pd.isna(r.source_id) else int(r.source_id),
+                 r.status, int(r.lead_score), now, now)
+                for r in valid.itertuples(index=False)
+            ]
+            columns = ["name", "email", "phone", "owner_id", "source_id", "status", "lead_score",
+                       "created_at", "updated_at"]
+            keyed = valid["email"].notna().tolist()
+            _timed(report, "leads", _insert, conn, "leads", columns, [r for r, k in zip(rows, keyed) if k])
+            unkeyed_ids = []
+            _timed(report, "leads", _insert_each, conn, "leads", columns, [r for r, k in zip(rows, keyed) if not k],
+                   unkeyed_ids)
+            emails = valid["email"].dropna().tolist()
+            by_email = {}
+            for batch in _batches(emails):
+                by_email.update((e.lower(), i) for i, e in conn.execute(_in(LEAD_IDS, "emails"), {"emails": batch}))
+            unkeyed = iter(unkeyed_ids)
+            ids = [int(by_email[e]) if pd.notna(e) else int(next(unkeyed)) for e in valid["email"]
+                   if pd.isna(e) or e in by_email]
+    report["total"] = (sum(r for r, _ in report.values()), time.perf_counter() - started)
+    return WriteResult(ids=ids, rejected=rejected.sort_index(), report=report)
+
+
+def convert_leads(engine, raw, users, stages, default_stage=None, default_value=0.0):
+    """Validate `raw` (see validate_conversions) and turn the leads into opportunities in one transaction.
+
+    Leads that do not exist or are already converted are rejected. The result's ids are the new
+    opportunity ids, in input order.
+    """
+    started = time.perf_counter()
+    df, rejected = validate_conversions(raw, users, stages, default_stage, default_value)
+    report, ids = {}, []
+    with engine.begin() as conn:
+        lead_ids = [int(i) for i in df["lead_id"]]
+        open_leads = {}
+        for batch in _batches(lead_ids):
+            stmt = CONVERTIBLE_LEADS + (" FOR UPDATE" if conn.dialect.name == "mysql" else "")
+            open_leads.update(dict(conn.execute(_in(stmt, "ids"), {"ids": batch}).fetchall()))
+        ok = df["lead_id"].isin(list(open_leads))
+        if not ok.all():
+            missing = raw.loc[df.index[~ok]].assign(error="lead not found or already converted")
+            rejected = pd.concat([rejected, missing])
+            df = df[ok]
+        if len(df):
+            now = _db_now(conn)
+            owners = df["owner_id"].fillna(df["lead_id"].map(open_leads))
+            lead_ids = [int(i) for i in df["lead_id"]]
+
+            opp_rows = [
+                (lead, None if pd.isna(owner) else int(owner), int(stage), float(value), now, now, now)
+                for lead, owner, stage, value in zip(lead_ids, owners, df["stage_id"], df["value"])
+            ]
+            _timed(report, "leads", _mark_converted, conn, lead_ids, now)
+            opp_columns = ["lead_id", "owner_id", "stage_id", "value", "created_at", "updated_at", "stage_entered_at"]
+            _timed(report, "opportunities", _insert, conn, "opportunities", opp_columns, opp_rows)
+            new_ids = {}
+            for batch in _batches(lead_ids):
+                new_ids.update(dict(conn.execute(_in(NEW_OPPORTUNITIES, "ids"), {"ids": batch}).fetchall()))
+            ids = [int(new_ids[lead]) for lead in lead_ids]
+            history = [(opp, int(stage), now) for opp, stage in zip(ids, df["stage_id"])]
+            _timed(report, "opportunity_stage_history", _insert,
+                   conn, "opportunity_stage_history", ["opportunity_id", "stage_id", "entered_at"], history)
+    report["total"] = (sum(r for r, _ in report.values()), time.perf_counter() - started)
+    return WriteResult(ids=ids, rejected=rejected.sort_index(), report=report)
+
+
+def format_report(report):
+    lines = [f"{'table':<28}{'rows':>10}{'seconds':>10}{'rows/sec':>12}"]
+    for table, (rows, secs) in report.items():
+        rate = rows / secs if secs else 0
+        lines.append(f"{table:<28}{rows:>10,}{secs:>10.2f}{rate:>12,.0f}")
+    return "\n".join(lines)
+
+
+def main():
+    from db_config import database_url, load_env
+    from query_layer import load_dimensions
+
+    parser = argparse.ArgumentParser(description="Bulk lead import and lead -> opportunity conversion")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="import leads from a CSV file (name,email,phone,owner,source,...)")
+    imp.add_argument("csv")
+    imp.add_argument("--dry-run", action="store_true", help="validate and dedupe only")
+    conv = sub.add_parser("convert", help="convert leads listed in a CSV file (lead_id[,value,owner,stage])")
+    conv.add_argument("csv")
+    conv.add_argument("--stage", help="stage name for rows without one (default: first stage)")
+    conv.add_argument("--value", type=float, default=0.0, help="value for rows without one")
+    for p in (imp, conv):
+        p.add_argument("--rejects", help="write rejected rows with their reason to this CSV")
+        p.add_argument("--database-url", help="defaults to DATABASE_URL / MYSQL_* from .env")
+    args = parser.parse_args()
+
+    load_env()
+    engine = create_engine(args.database_url or database_url(), pool_pre_ping=True)
+    with engine.connect() as conn:
+        sources, users, stages = load_dimensions(conn)
+    raw = pd.read_csv(args.csv, dtype=str, keep_default_na=False, na_values=[""])
+    if args.command == "import":
+        result = import_leads(engine, raw, users, sources, dry_run=args.dry_run)
+        verb = "would import" if args.dry_run else "imported"
+        print(f"{verb} {len(raw) - len(result.rejected):,} leads, rejected {len(result.rejected):,}")
+    else:
+        result = convert_leads(engine, raw, users, stages, default_stage=args.stage, default_value=args.value)
+        print(f"converted {len(result.ids):,} leads, rejected {len(result.rejected):,}")
+    if result.report:
+        print(format_report(result.report))
+    if len(result.rejected):
+        if args.rejects:
+            result.rejected.to_csv(args.rejects, index=False)
+        else:
+            result.rejected.to_csv(sys.stdout, index=False)
+    sys.exit(0 if result.rejected.empty else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# bench/bench_panel_loading.py
+# Sequential vs concurrent panel loading (app/panel_loader.py) against a SQLite stand-in with simulated
+# network latency, plus checks that per-query timeouts and cancellation really interrupt the statement
+# and hand the connection back to the pool. Exits non-zero if a check fails.
+#
+#   python bench/bench_panel_loading.py                      # seeds a 10k-lead stand-in under bench/.data/
+#   python bench/bench_panel_loading.py --latency-ms 50 --workers 6
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, os.path.join(ROOT, "app"))
+sys.path.insert(0, os.path.join(ROOT, "seed"))
+
+from sqlalchemy import create_engine, event, text  # noqa: E402
+
+import query_layer  # noqa: E402
+from bulk_seed import seed_database  # noqa: E402
+from local_db import SQLITE_SCHEMA, apply_sql_file, register_mysql_functions  # noqa: E402
+from panel_loader import PanelCancelled, PanelLoader, PanelTimeout  # noqa: E402
+from query_layer import Filters  # noqa: E402
+from stage_analytics import load_stage_history  # noqa: E402
+
+PANELS = {
+    "kpis": query_layer.kpis,
+    "weekly_leads": query_layer.weekly_leads,
+    "pipeline": query_layer.pipeline_by_stage,
+    "top_sources": query_layer.top_sources,
+    "recent_activities": query_layer.recent_activities,
+    "stage_history": load_stage_history,
+}
+
+# Keeps SQLite busy for far longer than any timeout below, in small steps that interrupt() can stop
+SLOW_QUERY = (
+    "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 1000000000) SELECT COUNT(*) FROM n"
+)
+
+
+def stand_in(path, leads, pool_size, latency):
+    fresh = not os.path.exists(path)
+    engine = create_engine(f"sqlite:///{path}", pool_size=pool_size, max_overflow=0, pool_timeout=10)
+    event.listen(engine, "connect", register_mysql_functions)
+    if fresh:
+        apply_sql_file(engine, SQLITE_SCHEMA)
+        seed_database(engine, leads=leads, log=lambda *_: None)
+
+    # Every statement pays one simulated round trip, as it would against a remote MySQL
+    def round_trip(conn, cursor, statement, parameters, context, executemany):
+        time.sleep(latency)
+    event.listen(engine, "before_cursor_execute", round_trip)
+    return engine
+
+
+def sequential(engine, f):
+    started, done = time.perf_counter(), {}
+    with engine.connect() as conn:
+        for name, fn in PANELS.items():
+            fn(conn, f)
+            done[name] = time.perf_counter() - started
+    return done
+
+
+def concurrent(loader, f):
+    started, done = time.perf_counter(), {}
+    with loader.batch({name: (fn, (f,)) for name, fn in PANELS.items()}) as batch:
+        for name, _, error in batch.as_completed(poll=0.05):
+            if error is not None:
+                raise error
+            done[name] = time.perf_counter() - started
+    return done
+
+
+def check(label, ok, detail=""):
+    print(f"  {'ok  ' if ok else 'FAIL'} {label}{' (' + detail + ')' if detail else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent panel loading with simulated latency")
+    parser.add_argument("--leads", type=int, default=10_000)
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="simulated round trip per statement")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--data-dir", default=os.path.join(HERE, ".data"))
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    path = os.path.join(args.data_dir, f"panels_{args.leads}.db")
+    engine = stand_in(path, args.leads, pool_size=args.workers + 1, latency=args.latency_ms / 1000)
+    loader = PanelLoader(engine, max_workers=args.workers, timeout=10.0, ttl=0)
+    f = Filters(date_min=date.today() - timedelta(days=90), date_max=date.today())
+
+    print(f"{len(PANELS)} panels, {args.latency_ms:g} ms simulated round trip, {args.workers} workers")
+    seq, conc = sequential(engine, f), concurrent(loader, f)
+    print(f"{'panel':<20}{'sequential ms':>15}{'concurrent ms':>15}")
+    for name in PANELS:
+        print(f"{name:<20}{seq[name] * 1000:>15.0f}{conc[name] * 1000:>15.0f}")
+    seq_total, conc_total = max(seq.values()), max(conc.values())
+    print(f"{'page':<20}{seq_total * 1000:>15.0f}{conc_total * 1000:>15.0f}   ({seq_total / conc_total:.1f}x)")
+
+    print("checks")
+    results = [check("concurrent page faster than sequential", conc_total < seq_total)]
+
+    # A statement running past its timeout is interrupted, not merely abandoned
+    started = time.perf_counter()
+    future, _ = loader.submit("slow", lambda conn: conn.exec_driver_sql(SLOW_QUERY).scalar(), timeout=0.5)
+    try:
+        future.result()
+        timed_out = False
+    except PanelTimeout:
+        timed_out = True
+    elapsed = time.perf_counter() - started
+    results.append(check("slow query times out after 0.5 s", timed_out and elapsed < 2, f"{elapsed:.2f} s"))
+
+    # Leaving a batch early cancels its running queries
+    slow = {"slow": (lambda conn: conn.exec_driver_sql(SLOW_QUERY).scalar(), ())}
+    started = time.perf_counter()
+    with loader.batch(slow) as batch:
+        time.sleep(0.3)
+    try:
+        batch.futures["slow"].result(timeout=5)
+        cancelled = False
+    except PanelCancelled:
+        cancelled = True
+    elapsed = time.perf_counter() - started
+    results.append(check("abandoned batch interrupts its query", cancelled and elapsed < 2, f"{elapsed:.2f} s"))
+
+    time.sleep(0.1)
+    results.append(check("every connection back in the pool", engine.pool.checkedout() == 0,
+                         f"{engine.pool.checkedout()} checked out"))
+    with engine.connect() as conn:
+        results.append(check("pooled connections still usable", conn.execute(text("SELECT 1")).scalar() == 1))
+
+    loader.shutdown()
+    engine.dispose()
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
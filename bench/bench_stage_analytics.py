@@ -0,0 +1,87 @@
+# bench/bench_stage_analytics.py
+# In-memory benchmark of app/stage_analytics.py at tens of millions of history rows.
+# Builds a synthetic stage-history frame with NumPy (same shape as load_stage_history returns, no database
+# involved) and times each metric, so the vectorized engine can be checked well past what SQLite seeds quickly.
+#
+#   python bench/bench_stage_analytics.py --rows 1000000,10000000,30000000
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "app"))
+
+import stage_analytics  # noqa: E402
+
+STAGES = pd.DataFrame({
+    "id": [1, 2, 3, 4, 5],
+    "name": ["Prospecting", "Qualification", "Proposal", "Negotiation", "Closed"],
+    "stage_order": [1, 2, 3, 4, 5],
+})
+
+
+def synthetic_history(rows, seed=0):
+    """About `rows` history rows: each opportunity walks 1-5 stages with exponential dwell times."""
+    rng = np.random.default_rng(seed)
+    n_opps = max(1, int(rows / 2.7))
+    reached = np.minimum(rng.geometric(0.4, n_opps), 5)
+    closed = reached == 5
+    offsets = rng.integers(0, 5 * 365 * 86400, n_opps).astype("timedelta64[s]")
+    start = np.datetime64("2020-01-01T00:00:00", "s") + offsets
+    opp = np.repeat(np.arange(1, n_opps + 1), reached)
+    first = np.repeat(np.cumsum(reached) - reached, reached)
+    stage = np.arange(len(opp)) - first + 1
+    dwell = (rng.exponential(9, len(opp)) * 86400).astype(np.int64)
+    dwell[stage == 1] = 0
+    cum = np.cumsum(dwell)
+    entered = np.repeat(start, reached) + (cum - cum[first]).astype("timedelta64[s]")
+    is_last = np.append(opp[1:] != opp[:-1], True)
+    left = np.append(entered[1:], entered[-1:]).astype("datetime64[s]")
+    left[is_last & ~np.repeat(closed, reached)] = np.datetime64("NaT")
+    status = np.where(closed, np.where(rng.random(n_opps) < 0.45, "WON", "LOST"), "OPEN")
+    closed_at = np.where(closed, entered[is_last], np.datetime64("NaT"))
+    return pd.DataFrame({
+        "id": np.arange(1, len(opp) + 1, dtype=np.uint32),
+        "opportunity_id": opp.astype(np.uint32),
+        "stage_id": stage.astype(np.uint8),
+        "entered_at": entered,
+        "left_at": left,
+        "status": pd.Categorical(np.repeat(status, reached)),
+        "opp_created_at": np.repeat(start, reached),
+        "closed_at": np.repeat(closed_at, reached),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the stage-history analytics engine in memory")
+    parser.add_argument("--rows", default="1000000,10000000", help="comma-separated history row counts")
+    parser.add_argument("--output", help="optional JSON results file")
+    args = parser.parse_args()
+
+    results = []
+    for rows in [int(r) for r in args.rows.split(",")]:
+        hist = synthetic_history(rows)
+        print(f"[{len(hist):,} history rows, {hist.memory_usage(deep=True).sum() / 2**20:,.0f} MB]")
+        for name, fn in (
+            ("time_in_stage", lambda: stage_analytics.time_in_stage(hist, STAGES)),
+            ("transition_matrix", lambda: stage_analytics.transition_matrix(hist, STAGES)),
+            ("cohort_funnel", lambda: stage_analytics.cohort_funnel(hist, STAGES)),
+            ("days_to_close", lambda: stage_analytics.days_to_close(hist)),
+        ):
+            t0 = time.perf_counter()
+            fn()
+            secs = time.perf_counter() - t0
+            results.append({"rows": len(hist), "name": name, "seconds": round(secs, 4)})
+            print(f"  {name:<20}{secs * 1000:>10.0f} ms  {len(hist) / secs / 1e6:>8.1f} M rows/s")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# bench/run_benchmarks.py
+# Benchmarks the dashboard data paths and the db/queries.sql reports at several data scales.
+# Each scale is seeded once into a SQLite stand-in under bench/.data/ (no network or MySQL needed)
+# and reused on later runs. Results are written as JSON so runs from different commits can be compared.
+#
+#   python bench/run_benchmarks.py                          # 10k and 100k leads
+#   python bench/run_benchmarks.py --scales 10k,100k,1m,10m
+#   python bench/run_benchmarks.py --compare bench/results/<older>.json
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, os.path.join(ROOT, "app"))
+sys.path.insert(0, os.path.join(ROOT, "seed"))
+
+from sqlalchemy import text  # noqa: E402
+
+import chart_data  # noqa: E402
+import query_layer  # noqa: E402
+import rollups  # noqa: E402
+import stage_analytics  # noqa: E402
+from bulk_seed import seed_database  # noqa: E402
+from index_advisor import migrate, parse_reports  # noqa: E402
+from lead_search import LeadSearchIndex  # noqa: E402
+from local_db import sqlite_engine  # noqa: E402
+from query_layer import Filters, filter_frame, load_dimensions  # noqa: E402
+from table_cache import TableCache  # noqa: E402
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _rows(result):
+    if hasattr(result, "shape"):
+        return int(result.shape[0])
+    if isinstance(result, (list, tuple, dict)):
+        return len(result)
+    return None
+
+
+def measure(fn, repeat):
+    """Median/min wall time over `repeat` untraced runs, then one tracemalloc run for peak Python-heap memory."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": round(statistics.median(times), 6),
+        "min_seconds": round(min(times), 6),
+        "peak_mb": round(peak / 2**20, 2),
+        "result_rows": _rows(result),
+    }, result
+
+
+def prepare_database(scale, data_dir, log):
+    path = os.path.join(data_dir, f"crm_{scale}.db")
+    fresh = not os.path.exists(path)
+    # Only a new file gets the schema; re-applying it would bring back the indexes migrate() dropped
+    engine = sqlite_engine(path, create_schema=fresh)
+    seeding = None
+    if fresh:
+        log(f"seeding {scale} leads into {path}")
+        report = seed_database(engine, leads=SCALES[scale], log=lambda *_: None)
+        rows, secs = report["total"]
+        seeding = {"rows": rows, "seconds": round(secs, 3), "rows_per_sec": round(rows / secs) if secs else None}
+    # Databases seeded by older runs get the composite indexes too (a no-op once they exist)
+    migrate(engine, log=lambda msg: log(f"  {msg}"))
+    return engine, seeding
+
+
+def bench_scale(scale, engine, filters, repeat, log):
+    results = []
+
+    def record(group, name, fn, times=repeat):
+        stats, result = measure(fn, times)
+        results.append({"scale": scale, "group": group, "name": name, **stats})
+        log(f"  {group:<8} {name[:45]:<45} {stats['seconds'] * 1000:>10.1f} ms  {stats['peak_mb']:>8.1f} MB")
+        return result
+
+    # Row-level load path (what load_tables() does on a cold cache)
+    def full_load():
+        cache = TableCache(engine)
+        leads, opps = cache.get("leads"), cache.get("opps")
+        with engine.connect() as conn:
+            load_dimensions(conn)
+        return cache, leads, opps
+
+    cache, leads, opps = record("load", "load_tables (cold)", full_load, times=1)
+    record("load", "table_cache.refresh (no changes)", lambda: cache.get("leads", force=True))
+
+    # The original in-memory panel transforms
+    f_leads = record("pandas", "filter_df(leads)", lambda: filter_frame(leads, filters))
+    f_opps = record("pandas", "filter_df(opps)", lambda: filter_frame(opps, filters))
+    record("pandas", "weekly resample W-MON",
+           lambda: f_leads.set_index("created_at").resample("W-MON").size().reset_index(name="count"))
+    record("pandas", "pipeline groupby stage",
+           lambda: f_opps.groupby("stage_name")["value"].sum().reset_index().sort_values("value", ascending=False))
+    record("pandas", "top sources merge",
+           lambda: f_opps[["lead_id"]].merge(f_leads[["id", "source_name"]], left_on="lead_id", right_on="id")
+           .groupby("source_name").size().reset_index(name="opps").sort_values("opps", ascending=False))
+
+    # SQL push-down panels (query_layer) and their rollup-backed variants
+    rollups.ensure_schema(engine)
+    record("rollup", "refresh_rollups (full)", lambda: rollups.refresh_rollups(engine, full=True), times=1)
+    record("rollup", "refresh_rollups (incremental, no changes)", lambda: rollups.refresh_rollups(engine))
+    for group, module in (("sql", query_layer), ("rollup", rollups)):
+        for name in ("kpis", "weekly_leads", "pipeline_by_stage", "top_sources"):
+            fn = getattr(module, name)
+
+            def run(fn=fn):
+                with engine.connect() as conn:
+                    return fn(conn, filters)
+            record(group, name, run)
+
+    # Chart data: daily counts binned to day/week/month, and a long raw series downsampled for Scattergl
+    def daily():
+        with engine.connect() as conn:
+            return query_layer.daily_leads(conn, filters)
+    daily_frame = record("charts", "daily_leads", daily)
+    record("charts", "pre_bin (day/week/month)", lambda: chart_data.pre_bin(daily_frame))
+    per_timestamp = leads["created_at"].value_counts().sort_index()
+    record("charts", f"line_figure ({len(per_timestamp):,} points, LTTB)",
+           lambda: chart_data.line_figure(per_timestamp, "leads"))
+
+    def recent():
+        with engine.connect() as conn:
+            return query_layer.recent_activities(conn, filters)
+    record("sql", "recent_activities", recent)
+
+    # Keyset-paged activity feed: a deep page should cost the same as the first
+    def feed_page(after=None):
+        with engine.connect() as conn:
+            return query_layer.activity_page(conn, filters, after=after)
+    page = record("feed", "activity_page (first)", feed_page)
+    for _ in range(19):
+        if page.next_cursor is None:
+            break
+        page = feed_page(page.next_cursor)
+    if page.next_cursor is not None:
+        record("feed", "activity_page (page 21, from cursor)", lambda: feed_page(page.next_cursor))
+
+    # Typeahead lead search: one build, then per-keystroke queries
+    index = record("search", "lead index build", lambda: _built(LeadSearchIndex(), leads), times=1)
+    sample = leads.iloc[len(leads) // 2]
+    for label, query in (("name prefix", str(sample["name"])[:3]), ("full name", str(sample["name"])),
+                         ("email prefix", str(sample["email"])[:8]), ("phone suffix", str(sample["phone"])[-4:])):
+        record("search", f"lead search ({label})", lambda query=query: index.search(query, k=20))
+
+    # Stage-history analytics: one read, then the vectorized metrics
+    def load_history():
+        with engine.connect() as conn:
+            return stage_analytics.load_stage_history(conn, filters)
+    hist = record("stages", "load_stage_history", load_history)
+    stage_frame = cache.get("stages")
+    record("stages", "time_in_stage", lambda: stage_analytics.time_in_stage(hist, stage_frame))
+    record("stages", "transition_matrix", lambda: stage_analytics.transition_matrix(hist, stage_frame))
+    record("stages", "cohort_funnel", lambda: stage_analytics.cohort_funnel(hist, stage_frame))
+    record("stages", "days_to_close", lambda: stage_analytics.days_to_close(hist)[0])
+
+    # db/queries.sql reports
+    for name, sql in parse_reports():
+        def run_report(sql=sql):
+            with engine.connect() as conn:
+                return conn.execute(text(sql)).fetchall()
+        record("report", name, run_report)
+    return results
+
+
+def _built(index, leads):
+    index.sync(leads)
+    return index
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    before = {(r["scale"], r["group"], r["name"]): r for r in baseline["results"]}
+    print(f"\ncompared with {baseline_path} ({baseline.get('commit')})")
+    print(f"{'scale':<6}{'group':<8}{'name':<45}{'before ms':>12}{'after ms':>12}{'ratio':>8}")
+    for r in current["results"]:
+        old = before.get((r["scale"], r["group"], r["name"]))
+        if not old:
+            continue
+        ratio = r["seconds"] / old["seconds"] if old["seconds"] else float("nan")
+        flag = "  <-- slower" if ratio > 1.2 else ""
+        print(f"{r['scale']:<6}{r['group']:<8}{r['name'][:45]:<45}{old['seconds'] * 1000:>12.1f}"
+              f"{r['seconds'] * 1000:>12.1f}{ratio:>8.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dashboard data paths and SQL reports")
+    parser.add_argument("--scales", default="10k,100k", help=f"comma-separated subset of {','.join(SCALES)}")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per step (median is reported)")
+    parser.add_argument("--days", type=int, default=90, help="dashboard date window, as the sidebar default")
+    parser.add_argument("--data-dir", default=os.path.join(HERE, ".data"))
+    parser.add_argument("--output", help="results file (default bench/results/<timestamp>_<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    args = parser.parse_args()
+
+    scales = [s.strip().lower() for s in args.scales.split(",") if s.strip()]
+    unknown = [s for s in scales if s not in SCALES]
+    if unknown:
+        parser.error(f"unknown scale(s): {', '.join(unknown)}")
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    filters = Filters(date_min=date.today() - timedelta(days=args.days), date_max=date.today())
+    commit = git_commit()
+    run = {"commit": commit, "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "repeat": args.repeat,
+           "filters": {"days": args.days}, "seeding": {}, "results": []}
+    for scale in scales:
+        print(f"[{scale}]")
+        engine, seeding = prepare_database(scale, args.data_dir, print)
+        if seeding:
+            run["seeding"][scale] = seeding
+        run["results"].extend(bench_scale(scale, engine, filters, args.repeat, print))
+        engine.dispose()
+
+    output = args.output or os.path.join(HERE, "results", f"{time.strftime('%Y%m%d-%H%M%S')}_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump(run, fh, indent=2)
+    print(f"\nwrote {output}")
+    if args.compare:
+        compare(run, args.compare)
+
+
+if __name__ == "__main__":
+    main()
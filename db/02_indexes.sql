@@ -1,8 +1,16 @@
 USE crm_db;
 CREATE INDEX idx_leads_created ON leads(created_at);
-CREATE INDEX idx_leads_owner ON leads(owner_id);
 CREATE INDEX idx_opps_stage ON opportunities(stage_id);
-CREATE INDEX idx_opps_owner ON opportunities(owner_id);
-CREATE INDEX idx_activities_created ON activities(created_at);
 CREATE INDEX idx_customers_owner ON customers(owner_id);
-CREATE INDEX idx_leads_source ON leads(source_id);
+-- Composite / covering indexes for the dashboard queries (kept in step with app/index_advisor.py INDEXES)
+CREATE INDEX idx_leads_owner_created ON leads(owner_id, created_at);
+CREATE INDEX idx_leads_source_created ON leads(source_id, created_at);
+CREATE INDEX idx_leads_email ON leads(email);
+CREATE INDEX idx_leads_updated ON leads(updated_at);
+CREATE INDEX idx_opps_created_cover ON opportunities(created_at, status, stage_id, value);
+CREATE INDEX idx_opps_owner_created ON opportunities(owner_id, created_at, status, stage_id, value);
+CREATE INDEX idx_opps_status_stage ON opportunities(status, stage_id, value);
+CREATE INDEX idx_opps_lead ON opportunities(lead_id);
+CREATE INDEX idx_opps_updated ON opportunities(updated_at);
+CREATE INDEX idx_activities_created_id ON activities(created_at DESC, id DESC);
+CREATE INDEX idx_history_opp_entered ON opportunity_stage_history(opportunity_id, entered_at);
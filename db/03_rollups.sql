@@ -0,0 +1,32 @@
+USE crm_db;
+-- Daily pre-aggregates maintained by app/rollups.py (python app/rollups.py [--full]).
+-- NULL keys are stored as 0 / '' so they can be part of the primary key.
+
+-- Leads per day x owner x source x status
+CREATE TABLE IF NOT EXISTS rollup_leads_daily (
+  day DATE NOT NULL,
+  owner_id BIGINT NOT NULL DEFAULT 0,
+  source_id INT NOT NULL DEFAULT 0,
+  status VARCHAR(20) NOT NULL DEFAULT '',
+  leads INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, owner_id, source_id, status)
+);
+
+-- Opportunities per day x owner x source (of the originating lead) x stage x status
+CREATE TABLE IF NOT EXISTS rollup_opps_daily (
+  day DATE NOT NULL,
+  owner_id BIGINT NOT NULL DEFAULT 0,
+  source_id INT NOT NULL DEFAULT 0,
+  stage_id INT NOT NULL DEFAULT 0,
+  status VARCHAR(20) NOT NULL DEFAULT '',
+  opps INT NOT NULL DEFAULT 0,
+  value DECIMAL(16,2) NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, owner_id, source_id, stage_id, status)
+);
+
+-- Last updated_at seen per source table, so each run only recomputes touched days
+CREATE TABLE IF NOT EXISTS rollup_state (
+  name VARCHAR(64) NOT NULL PRIMARY KEY,
+  watermark DATETIME NULL,
+  refreshed_at DATETIME NULL
+);
@@ -60,3 +60,43 @@ LEFT JOIN opportunities o ON o.lead_id = l.id
 GROUP BY l.source_id, s.name
 ORDER BY conv_pct DESC
 LIMIT 10;
+
+
+-- ---------------------------------------------------------------------------
+-- Rollup-backed variants (db/03_rollups.sql, refreshed by `python app/rollups.py`)
+-- Same answers as A, C, E and F above, but they read day-level aggregates instead of raw rows.
+-- ---------------------------------------------------------------------------
+
+-- A (rollup). New leads per week
+SELECT YEAR(day) AS yr, WEEK(day,1) AS wk, SUM(leads) AS new_leads
+FROM rollup_leads_daily
+WHERE day BETWEEN '2025-01-01' AND '2025-12-31'
+GROUP BY yr, wk
+ORDER BY yr, wk;
+
+
+-- C (rollup). Pipeline value by stage
+SELECT s.name AS stage, SUM(r.value) AS pipeline_value
+FROM rollup_opps_daily r
+LEFT JOIN stages s ON r.stage_id = s.id
+WHERE r.status <> 'LOST'
+GROUP BY s.name
+ORDER BY pipeline_value DESC;
+
+
+-- E (rollup). Win rate
+SELECT SUM(r.opps) AS total_opps,
+       SUM(CASE WHEN r.status = 'WON' THEN r.opps ELSE 0 END) AS won,
+       ROUND(100 * SUM(CASE WHEN r.status = 'WON' THEN r.opps ELSE 0 END) / NULLIF(SUM(r.opps),0),2) AS win_rate_pct
+FROM rollup_opps_daily r;
+
+
+-- F (rollup). Top sources by conversion (opps counted by the source of their lead)
+SELECT ls.source_id, s.name AS source_name, ls.leads, COALESCE(os.opps, 0) AS opps,
+       ROUND(100 * COALESCE(os.opps, 0) / NULLIF(ls.leads,0),2) AS conv_pct
+FROM (SELECT source_id, SUM(leads) AS leads FROM rollup_leads_daily GROUP BY source_id) ls
+LEFT JOIN (SELECT source_id, SUM(opps) AS opps FROM rollup_opps_daily GROUP BY source_id) os
+       ON os.source_id = ls.source_id
+LEFT JOIN sources s ON ls.source_id = s.id
+ORDER BY conv_pct DESC
+LIMIT 10;
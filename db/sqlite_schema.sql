@@ -0,0 +1,108 @@
+-- SQLite stand-in for 01_create_schema.sql + 02_indexes.sql
+-- Used for local runs of the rollup job, seeding engine and benchmarks without a MySQL server.
+-- ENUMs become TEXT with CHECK constraints; DATETIME values are stored as 'YYYY-MM-DD HH:MM:SS' text.
+
+CREATE TABLE IF NOT EXISTS users (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name VARCHAR(150) NOT NULL,
+  email VARCHAR(200) NOT NULL UNIQUE,
+  role TEXT DEFAULT 'REP' CHECK (role IN ('REP','MANAGER','ADMIN')),
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS sources (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name VARCHAR(100) NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS stages (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name VARCHAR(100) NOT NULL,
+  stage_order INT DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS customers (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name VARCHAR(255) NOT NULL,
+  company VARCHAR(255),
+  email VARCHAR(255),
+  phone VARCHAR(50),
+  owner_id BIGINT REFERENCES users(id) ON DELETE SET NULL,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS contacts (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  customer_id BIGINT NOT NULL REFERENCES customers(id) ON DELETE CASCADE,
+  name VARCHAR(255) NOT NULL,
+  email VARCHAR(255),
+  phone VARCHAR(50),
+  role VARCHAR(100),
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS leads (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name VARCHAR(255),
+  email VARCHAR(255),
+  phone VARCHAR(50),
+  owner_id BIGINT REFERENCES users(id) ON DELETE SET NULL,
+  source_id INT REFERENCES sources(id) ON DELETE SET NULL,
+  status TEXT DEFAULT 'NEW' CHECK (status IN ('NEW','CONTACTED','QUALIFIED','CONVERTED','DISCARDED')),
+  lead_score INT DEFAULT 0,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  converted_at DATETIME NULL
+);
+
+CREATE TABLE IF NOT EXISTS opportunities (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  lead_id BIGINT NULL REFERENCES leads(id) ON DELETE SET NULL,
+  customer_id BIGINT NULL REFERENCES customers(id) ON DELETE SET NULL,
+  owner_id BIGINT REFERENCES users(id) ON DELETE SET NULL,
+  stage_id INT REFERENCES stages(id) ON DELETE SET NULL,
+  value DECIMAL(12,2) DEFAULT 0,
+  status TEXT DEFAULT 'OPEN' CHECK (status IN ('OPEN','WON','LOST')),
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  stage_entered_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  closed_at DATETIME NULL
+);
+
+CREATE TABLE IF NOT EXISTS opportunity_stage_history (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  opportunity_id BIGINT NOT NULL REFERENCES opportunities(id) ON DELETE CASCADE,
+  stage_id INT NOT NULL REFERENCES stages(id) ON DELETE CASCADE,
+  entered_at DATETIME NOT NULL,
+  left_at DATETIME NULL
+);
+
+CREATE TABLE IF NOT EXISTS activities (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  lead_id BIGINT NULL REFERENCES leads(id) ON DELETE CASCADE,
+  opportunity_id BIGINT NULL REFERENCES opportunities(id) ON DELETE CASCADE,
+  user_id BIGINT REFERENCES users(id) ON DELETE SET NULL,
+  activity_type TEXT DEFAULT 'NOTE' CHECK (activity_type IN ('CALL','EMAIL','MEETING','NOTE','TASK')),
+  subject VARCHAR(255),
+  notes TEXT,
+  due_date DATETIME NULL,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_leads_created ON leads(created_at);
+CREATE INDEX IF NOT EXISTS idx_opps_stage ON opportunities(stage_id);
+CREATE INDEX IF NOT EXISTS idx_customers_owner ON customers(owner_id);
+-- Composite / covering indexes for the dashboard queries (kept in step with app/index_advisor.py INDEXES)
+CREATE INDEX IF NOT EXISTS idx_leads_owner_created ON leads(owner_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_leads_source_created ON leads(source_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_leads_email ON leads(email);
+CREATE INDEX IF NOT EXISTS idx_leads_updated ON leads(updated_at);
+CREATE INDEX IF NOT EXISTS idx_opps_created_cover ON opportunities(created_at, status, stage_id, value);
+CREATE INDEX IF NOT EXISTS idx_opps_owner_created ON opportunities(owner_id, created_at, status, stage_id, value);
+CREATE INDEX IF NOT EXISTS idx_opps_status_stage ON opportunities(status, stage_id, value);
+CREATE INDEX IF NOT EXISTS idx_opps_lead ON opportunities(lead_id);
+CREATE INDEX IF NOT EXISTS idx_opps_updated ON opportunities(updated_at);
+CREATE INDEX IF NOT EXISTS idx_activities_created_id ON activities(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_history_opp_entered ON opportunity_stage_history(opportunity_id, entered_at);
@@ -0,0 +1,37 @@
+# tests/conftest.py
+# The app modules import each other by bare name (they run as scripts from app/), so put app/ on the path.
+# Shared fixtures: SQLite stand-ins (local_db.sqlite_engine, CRM schema applied) in the test's tmp dir.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from local_db import sqlite_engine  # noqa: E402
+
+
+@pytest.fixture
+def make_engine(tmp_path):
+    """make_engine(name) -> a SQLite stand-in at tmp_path / name; every engine made is disposed afterwards."""
+    made = []
+
+    def make(name="crm.db"):
+        engine = sqlite_engine(str(tmp_path / name))
+        made.append(engine)
+        return engine
+    yield make
+    for engine in made:
+        engine.dispose()
+
+
+@pytest.fixture
+def engine(make_engine):
+    """The CRM stand-in with dimensions only: two users sharing a name, two sources and two stages, no leads."""
+    engine = make_engine()
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO users (id, name, email) VALUES (1, 'Sam Lee', 'sam@a.example'), "
+                             "(2, 'Sam Lee', 'sam@b.example')")
+        conn.exec_driver_sql("INSERT INTO sources (id, name) VALUES (1, 'Web'), (2, 'Referral')")
+        conn.exec_driver_sql("INSERT INTO stages (id, name, stage_order) VALUES (1, 'Prospecting', 1), (2, 'Won', 2)")
+    return engine
@@ -0,0 +1,95 @@
+# tests/test_db_router.py
+# DbRouter with SQLite files standing in for the primary and its replicas.
+import os
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, event
+
+from db_router import DbRouter
+
+
+def _server(engine):
+    return os.path.basename(engine.url.database)
+
+
+def _read_from(router):
+    with router.connect() as conn:
+        return _server(conn.engine)
+
+
+@pytest.fixture
+def engines(make_engine):
+    return {name: make_engine(name) for name in ("primary.db", "r1.db", "r2.db")}
+
+
+def test_reads_alternate_between_replicas(engines):
+    router = DbRouter(engines["primary.db"], [engines["r1.db"], engines["r2.db"]])
+    assert [_read_from(router) for _ in range(4)] == ["r1.db", "r2.db", "r1.db", "r2.db"]
+    assert [row["reads"] for row in router.status()] == [None, 2, 2]
+
+
+def test_unreachable_replica_is_skipped(engines, tmp_path):
+    down = create_engine(f"sqlite:///{tmp_path / 'missing' / 'r0.db'}")
+    router = DbRouter(engines["primary.db"], [down, engines["r2.db"]], check_interval=60)
+    assert [_read_from(router) for _ in range(3)] == ["r2.db"] * 3
+    assert [row["healthy"] for row in router.status()] == [True, False, True]
+
+
+def test_primary_serves_reads_when_no_replica_is_usable(engines, tmp_path):
+    replicas = [create_engine(f"sqlite:///{tmp_path / 'missing' / name}") for name in ("r1.db", "r2.db")]
+    router = DbRouter(engines["primary.db"], replicas)
+    assert _read_from(router) == "primary.db"
+
+
+def test_saturated_replica_pool_falls_back(engines):
+    # A pool TimeoutError is not a DBAPIError; the replica is skipped all the same
+    busy = create_engine(engines["r1.db"].url, pool_size=1, max_overflow=0, pool_timeout=0.05)
+    router = DbRouter(engines["primary.db"], [busy], check_interval=60)
+    assert _read_from(router) == "r1.db"
+    with busy.connect():
+        assert _read_from(router) == "primary.db"
+    assert router.status()[1]["healthy"] is False
+    busy.dispose()
+
+
+def test_a_due_health_check_runs_once(engines):
+    slow = engines["r1.db"]
+    checks = []
+
+    def slow_check(conn, cursor, statement, parameters, context, executemany):
+        if statement == "SELECT 1":
+            checks.append(1)
+            time.sleep(0.3)
+    event.listen(slow, "before_cursor_execute", slow_check)
+    router = DbRouter(engines["primary.db"], [slow], check_interval=60)
+    served = []
+    threads = [threading.Thread(target=lambda: served.append(_read_from(router))) for _ in range(4)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(checks) == 1
+    assert served == ["r1.db"] * 4
+    # Only the thread running the check waited for it
+    assert time.perf_counter() - started < 0.6
+
+
+def test_a_session_reads_its_writes_from_the_primary(engines):
+    router = DbRouter(engines["primary.db"], [engines["r1.db"]], sticky=0.2)
+    state, other = {}, {}
+    assert router.reader(state) is router
+    router.wrote(state)
+    assert router.reader(state) is engines["primary.db"]
+    assert router.reader(other) is router
+    time.sleep(0.25)
+    assert router.reader(state) is router
+
+
+def test_without_replicas_everything_uses_the_primary(engines):
+    router = DbRouter(engines["primary.db"])
+    router.wrote({})
+    assert router.reader({}) is engines["primary.db"]
+    assert _read_from(router) == "primary.db"
@@ -0,0 +1,37 @@
+# tests/test_export.py
+# Chunked export with the dashboard's row limit, on the conftest stand-in plus a few leads.
+import io
+import shlex
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from export import cli_command, write_export
+from query_layer import Filters
+
+
+@pytest.fixture
+def engine(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO leads (name, email, owner_id, source_id, created_at, updated_at) VALUES "
+            + ", ".join(f"('Lead {i}', 'lead{i}@x.example', 1, 1, '2026-01-0{i} 10:00:00', '2026-01-0{i} 10:00:00')"
+                        for i in range(1, 6))
+        )
+    return engine
+
+
+@pytest.mark.parametrize("limit, rows", [(None, 5), (3, 3), (10, 5)])
+def test_limit_caps_the_rows_written_across_chunks(engine, limit, rows):
+    out = io.BytesIO()
+    assert write_export(engine, "leads", Filters(), "csv", out, chunksize=2, limit=limit) == rows
+    assert pd.read_csv(io.BytesIO(out.getvalue()))["id"].tolist() == list(range(1, rows + 1))
+
+
+def test_cli_command_repeats_the_filters():
+    f = Filters(owner="Sam Lee", source="All", date_min=date(2026, 1, 1), date_max=date(2026, 1, 31))
+    assert shlex.split(cli_command("opps", f, "parquet")) == [
+        "python", "app/export.py", "--kind", "opps", "--format", "parquet", "--owner", "Sam Lee",
+        "--from", "2026-01-01", "--to", "2026-01-31", "--out", "opps_filtered.parquet",
+    ]
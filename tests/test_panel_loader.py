@@ -0,0 +1,154 @@
+# tests/test_panel_loader.py
+# PanelLoader against a SQLite stand-in whose statements each pay a simulated round trip.
+import threading
+import time
+
+import pytest
+from sqlalchemy import event
+
+from panel_loader import PanelCancelled, PanelLoader, PanelTimeout, _Query
+from result_cache import MISS
+
+LATENCY = 0.2
+
+# Keeps SQLite busy far longer than any timeout here, in small steps that interrupt() can stop
+SLOW_QUERY = (
+    "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 1000000000) SELECT COUNT(*) FROM n"
+)
+
+
+@pytest.fixture
+def engine(engine):
+    # The conftest stand-in, with a simulated round trip on each SELECT
+    def round_trip(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "RECURSIVE" not in statement:
+            time.sleep(LATENCY)
+    event.listen(engine, "before_cursor_execute", round_trip)
+    return engine
+
+
+@pytest.fixture
+def loader(engine):
+    loader = PanelLoader(engine, max_workers=4, timeout=10.0, ttl=0)
+    yield loader
+    loader.shutdown()
+
+
+def _count_leads(conn):
+    return conn.exec_driver_sql("SELECT COUNT(*) FROM leads").scalar()
+
+
+def _slow(conn):
+    return conn.exec_driver_sql(SLOW_QUERY).scalar()
+
+
+def test_panels_run_concurrently(loader):
+    panels = {f"panel{i}": (_count_leads, ()) for i in range(4)}
+    started = time.perf_counter()
+    with loader.batch(panels) as batch:
+        results = {name: (result, error) for name, result, error in batch.as_completed(poll=0.05)}
+    elapsed = time.perf_counter() - started
+    assert results == {name: (0, None) for name in panels}
+    # Four round trips one after another would take 4 * LATENCY
+    assert elapsed < 2.5 * LATENCY
+
+
+def test_slow_query_times_out_and_is_interrupted(loader, engine):
+    started = time.perf_counter()
+    future, _ = loader.submit("slow", _slow, timeout=0.3)
+    with pytest.raises(PanelTimeout):
+        future.result(timeout=5)
+    assert time.perf_counter() - started < 2
+    assert engine.pool.checkedout() == 0
+
+
+def test_leaving_a_batch_cancels_running_queries(loader, engine):
+    with loader.batch({"slow": (_slow, ())}) as batch:
+        time.sleep(0.2)
+    started = time.perf_counter()
+    with pytest.raises(PanelCancelled):
+        batch.futures["slow"].result(timeout=5)
+    assert time.perf_counter() - started < 2
+    time.sleep(0.05)
+    assert engine.pool.checkedout() == 0
+    with engine.connect() as conn:
+        assert _count_leads(conn) == 0
+
+
+@pytest.mark.parametrize("invalidated", [False, True], ids=["kept", "invalidated"])
+def test_result_of_a_panel_invalidated_while_running_is_not_cached(engine, invalidated):
+    loader = PanelLoader(engine, max_workers=2, timeout=10.0, ttl=60)
+    cache_key = ("leads", "all", None)
+    try:
+        with loader.batch({"leads": (_count_leads, ())}, key="all") as batch:
+            # A write lands while the query (LATENCY s) is still running
+            time.sleep(LATENCY / 2)
+            if invalidated:
+                loader.invalidate(["leads"])
+            assert [(name, result) for name, result, _ in batch.as_completed(poll=0.01)] == [("leads", 0)]
+        # The result is stored by a done callback that can run just after as_completed() yields it
+        deadline = time.monotonic() + 1.0
+        while loader.cache.get(cache_key) is MISS and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert (loader.cache.get(cache_key) is MISS) == invalidated
+    finally:
+        loader.shutdown()
+
+
+class _FakeConnection:
+    def __init__(self, query, log):
+        self.query, self.log = query, log
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def exec_driver_sql(self, sql):
+        self.log.append(sql)
+
+
+class _FakeServer:
+    """Stands in for a MySQL engine: records whether the query's lock was held while a connection was taken."""
+
+    def __init__(self):
+        self.query = None
+        self.locked_on_checkout = []
+        self.statements = []
+
+    def connect(self):
+        self.locked_on_checkout.append(self.query._lock.locked())
+        return _FakeConnection(self.query, self.statements)
+
+
+def _running_mysql_query(server):
+    query = _Query(server, "kpis", None, (), timeout=None)
+    server.query = query
+    query._dbapi, query._server, query._mysql_thread = object(), server, 42
+    return query
+
+
+def test_kill_query_connection_is_taken_without_the_lock():
+    server = _FakeServer()
+    query = _running_mysql_query(server)
+    query.cancel()
+    assert server.locked_on_checkout == [False]
+    assert server.statements == ["KILL QUERY 42"]
+    assert query.state == "cancelled"
+
+
+def test_no_kill_once_the_statement_has_finished():
+    server = _FakeServer()
+    query = _running_mysql_query(server)
+    # run() finishes (and hands the connection back) while cancel() waits for its KILL connection
+    finished = threading.Event()
+
+    def connect():
+        query._dbapi = None
+        finished.set()
+        return _FakeConnection(query, server.statements)
+    server.connect = connect
+    query.cancel()
+    assert finished.is_set()
+    assert server.statements == []
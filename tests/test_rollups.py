@@ -0,0 +1,68 @@
+# tests/test_rollups.py
+# The rollup readers against the live queries they stand in for, on the conftest stand-in plus a few leads and
+# opportunities whose day and owner differ from their lead's.
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import query_layer
+import rollups
+from query_layer import Filters
+
+
+@pytest.fixture
+def engine(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO users (id, name, email) VALUES (3, 'Kim Ng', 'kim@a.example')")
+        conn.exec_driver_sql(
+            "INSERT INTO leads (id, name, email, owner_id, source_id, created_at, updated_at) VALUES "
+            "(1, 'Ann', 'ann@x.example', 3, 1, '2026-01-05 10:00:00', '2026-01-05 10:00:00'), "
+            "(2, 'Bob', 'bob@x.example', 1, 1, '2025-12-20 10:00:00', '2025-12-20 10:00:00'), "
+            "(3, 'Cy', 'cy@x.example', 3, 2, '2026-01-07 10:00:00', '2026-01-07 10:00:00')"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO opportunities (lead_id, owner_id, stage_id, value, status, created_at, updated_at) VALUES "
+            "(1, 1, 1, 100, 'OPEN', '2026-01-10 09:00:00', '2026-01-10 09:00:00'), "
+            "(2, 3, 1, 200, 'OPEN', '2026-01-12 09:00:00', '2026-01-12 09:00:00'), "
+            "(1, 3, 2, 300, 'WON', '2026-01-11 09:00:00', '2026-01-11 09:00:00'), "
+            "(3, 3, 2, 50, 'LOST', '2026-01-13 09:00:00', '2026-01-13 09:00:00')"
+        )
+    rollups.ensure_schema(engine)
+    rollups.refresh_rollups(engine, full=True)
+    return engine
+
+
+FILTERS = [
+    Filters(),
+    Filters(date_min=date(2026, 1, 1), date_max=date(2026, 1, 31)),
+    # Opportunity 2 is Kim's and in the window, but its lead is neither
+    Filters(owner="Kim Ng", date_min=date(2026, 1, 1), date_max=date(2026, 1, 31)),
+    Filters(owner="Kim Ng", source="Web", date_min=date(2026, 1, 1), date_max=date(2026, 1, 31)),
+]
+
+
+def _sorted(df):
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("f", FILTERS, ids=["default", "window", "owner", "owner+source"])
+def test_rollup_readers_match_the_live_queries(engine, f):
+    with engine.connect() as conn:
+        assert rollups.kpis(conn, f) == pytest.approx(query_layer.kpis(conn, f))
+        live, rolled = query_layer.daily_leads(conn, f), rollups.daily_leads(conn, f)
+        for df in (live, rolled):
+            df["day"] = pd.to_datetime(df["day"])
+            df["n"] = df["n"].astype("int64")
+        pd.testing.assert_frame_equal(_sorted(rolled), _sorted(live))
+        live, rolled = query_layer.pipeline_by_stage(conn, f), rollups.pipeline_by_stage(conn, f)
+        pd.testing.assert_frame_equal(_sorted(rolled), _sorted(live), check_dtype=False)
+        live, rolled = query_layer.top_sources(conn, f), rollups.top_sources(conn, f)
+        pd.testing.assert_frame_equal(rolled, live)
+
+
+def test_top_sources_counts_only_opportunities_of_leads_in_the_filters(engine):
+    with engine.connect() as conn:
+        top = rollups.top_sources(conn, FILTERS[2])
+    # Opportunity 2 (Web, Kim's) does not count: its lead is Sam's and from December
+    assert dict(zip(top["source_name"], top["opps"])) == {"Web": 1, "Referral": 1}
@@ -0,0 +1,40 @@
+# tests/test_stage_analytics.py
+import numpy as np
+import pandas as pd
+
+from stage_analytics import transition_matrix
+
+STAGES = pd.DataFrame({"id": [1, 2, 3], "name": ["Prospecting", "Proposal", "Negotiation"], "stage_order": [1, 2, 3]})
+
+
+def _history(rows):
+    hist = pd.DataFrame(rows, columns=["opportunity_id", "stage_id", "entered_at", "status"])
+    hist["entered_at"] = pd.to_datetime(hist["entered_at"])
+    hist["id"] = np.arange(1, len(hist) + 1)
+    return hist
+
+
+def test_transition_counts():
+    hist = _history([
+        (1, 1, "2024-01-01", "WON"), (1, 2, "2024-01-05", "WON"),
+        (2, 1, "2024-01-02", "LOST"),
+    ])
+    m = transition_matrix(hist, STAGES, normalize=False)
+    assert m.loc["Prospecting", "Proposal"] == 1
+    assert m.loc["Prospecting", "→ LOST"] == 1
+    assert m.loc["Proposal", "→ WON"] == 1
+    assert m.to_numpy().sum() == 3
+
+
+def test_unknown_stage_is_not_counted_in_another_cell():
+    # Stage 9 is not in the stages table: Prospecting -> 9 and 9 -> Proposal have no cell of their own and
+    # must not land in a neighbouring one
+    hist = _history([
+        (1, 2, "2024-01-01", "OPEN"), (1, 1, "2024-01-02", "OPEN"),
+        (1, 9, "2024-01-03", "OPEN"), (1, 2, "2024-01-04", "OPEN"),
+    ])
+    m = transition_matrix(hist, STAGES, normalize=False)
+    assert m.loc["Proposal", "Prospecting"] == 1
+    assert m.loc["Proposal", "→ OPEN"] == 1
+    assert m.loc["Prospecting"].sum() == 0
+    assert m.to_numpy().sum() == 2
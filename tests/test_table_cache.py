@@ -0,0 +1,64 @@
+# tests/test_table_cache.py
+# TableCache versions against a SQLite stand-in, and the panel results keyed on them.
+import time
+
+import pytest
+
+from panel_loader import PanelLoader
+from result_cache import MISS
+from table_cache import TableCache
+
+
+@pytest.fixture
+def engine(engine):
+    # The conftest stand-in plus two leads
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO leads (name, email, owner_id, source_id, created_at, updated_at) VALUES "
+            "('Ann', 'ann@x.example', 1, 1, '2026-01-05 10:00:00', '2026-01-05 10:00:00'), "
+            "('Bob', 'bob@x.example', 1, 1, '2026-01-06 10:00:00', '2026-01-06 10:00:00')"
+        )
+    return engine
+
+
+def _stored(loader, cache_key, timeout=2.0):
+    # Results are stored by a done callback, which may run just after the caller sees the result
+    deadline = time.monotonic() + timeout
+    while loader.cache.get(cache_key) is MISS:
+        assert time.monotonic() < deadline, f"{cache_key} was never cached"
+        time.sleep(0.01)
+
+
+@pytest.mark.parametrize("reconcile_interval", [900, 0], ids=["delta", "full"])
+def test_panel_cache_hit_survives_a_no_op_refresh(engine, reconcile_interval):
+    cache = TableCache(engine, refresh_interval=0, reconcile_interval=reconcile_interval)
+    loader = PanelLoader(engine, ttl=0)
+    calls = []
+
+    def count_leads(conn):
+        calls.append(1)
+        return conn.exec_driver_sql("SELECT COUNT(*) FROM leads").scalar()
+
+    def load():
+        versions = {"leads": cache.version("leads")}
+        with loader.batch({"leads": (count_leads, ())}, key="all", versions=versions) as batch:
+            result = {name: value for name, value, _ in batch.as_completed(poll=0.01)}
+        _stored(loader, ("leads", "all", versions["leads"]))
+        return result["leads"]
+
+    try:
+        cache.get("leads")
+        assert load() == 2 and len(calls) == 1
+        version = cache.version("leads")
+        # Nothing changed: the refresh (delta or full reload) keeps the version, so the panel result is reused
+        cache.get("leads", force=True)
+        assert cache.version("leads") == version
+        assert load() == 2 and len(calls) == 1
+        with engine.begin() as conn:
+            conn.exec_driver_sql("INSERT INTO leads (name, email, owner_id, source_id, created_at, updated_at) "
+                                 "VALUES ('Cy', 'cy@x.example', 1, 1, '2026-01-07 10:00:00', '2026-01-07 10:00:00')")
+        cache.get("leads", force=True)
+        assert cache.version("leads") != version
+        assert load() == 3 and len(calls) == 2
+    finally:
+        loader.shutdown()
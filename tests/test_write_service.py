@@ -0,0 +1,69 @@
+# tests/test_write_service.py
+# Lead import and conversion against the conftest stand-in (two users sharing a name, two sources, no leads).
+import pandas as pd
+import pytest
+
+from query_layer import load_dimensions
+from write_service import convert_leads, import_leads
+
+
+@pytest.fixture
+def dims(engine):
+    with engine.connect() as conn:
+        return load_dimensions(conn)
+
+
+def _leads(engine):
+    with engine.connect() as conn:
+        return pd.read_sql("SELECT * FROM leads ORDER BY id", conn)
+
+
+def test_import_validates_and_dedupes(engine, dims):
+    sources, users, _ = dims
+    raw = pd.DataFrame({
+        "name": ["Ann", "Bob", "", "Dee", "Eve"],
+        "email": ["ann@x.example", "ANN@x.example", "cy@x.example", "dee@x.example", "not-an-email"],
+        "owner": ["Sam Lee", "", "", "", ""],
+        "source": ["Web", "", "", "", ""],
+        "status": ["", "", "", "CONVERTED", ""],
+    })
+    result = import_leads(engine, raw, users, sources)
+    assert len(result.ids) == 1
+    assert result.rejected["error"].tolist() == [
+        "duplicate email in file", "missing name", "status CONVERTED is set by converting the lead", "invalid email",
+    ]
+    leads = _leads(engine)
+    # A user name shared by several users resolves to the first of them
+    assert leads[["email", "owner_id", "source_id", "status"]].values.tolist() == [["ann@x.example", 1, 1, "NEW"]]
+    again = import_leads(engine, raw.iloc[:1], users, sources)
+    assert again.ids == [] and again.rejected["error"].tolist() == ["email already exists"]
+
+
+def test_form_may_leave_name_and_email_blank(engine, dims):
+    sources, users, _ = dims
+    row = pd.DataFrame([{"name": "", "email": "", "phone": "555 0100", "owner": "Sam Lee", "source": "Web"}])
+    first = import_leads(engine, row, users, sources, require_contact=False)
+    second = import_leads(engine, row, users, sources, require_contact=False)
+    leads = _leads(engine)
+    assert first.ids + second.ids == leads["id"].tolist()
+    assert leads["name"].isna().all() and leads["email"].isna().all()
+    bad = import_leads(engine, row.assign(email="nope"), users, sources, require_contact=False)
+    assert bad.rejected["error"].tolist() == ["invalid email"]
+
+
+def test_conversion_writes_one_timestamp(engine, dims):
+    sources, users, stages = dims
+    imported = import_leads(engine, pd.DataFrame({"name": ["Ann", "Bob"], "email": ["a@x.example", "b@x.example"]}),
+                            users, sources)
+    raw = pd.DataFrame({"lead_id": [str(i) for i in imported.ids] + ["999"], "value": ["100", "", ""]})
+    result = convert_leads(engine, raw, users, stages)
+    assert len(result.ids) == 2
+    assert result.rejected["error"].tolist() == ["lead not found or already converted"]
+    with engine.connect() as conn:
+        stamps = {v for (v,) in conn.exec_driver_sql(
+            "SELECT converted_at FROM leads UNION SELECT updated_at FROM leads WHERE status = 'CONVERTED' "
+            "UNION SELECT created_at FROM opportunities UNION SELECT stage_entered_at FROM opportunities "
+            "UNION SELECT entered_at FROM opportunity_stage_history")}
+    assert len(stamps) == 1
+    again = convert_leads(engine, raw.iloc[:1], users, stages)
+    assert again.ids == [] and again.rejected["error"].tolist() == ["lead not found or already converted"]